@@ -12,9 +12,77 @@ class Settings:
     DB_USER: str = os.getenv("DB_USER", "company_llm_user")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "supersecretpassword")
 
+    # Async connection pool used by the API endpoints
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
     # Auth settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "change-this-secret-in-prod")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # get_current_user caches user rows per worker; role changes / deletions
+    # become visible after at most AUTH_USER_CACHE_TTL_SECONDS (0 disables the cache).
+    AUTH_USER_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+    AUTH_USER_CACHE_MAX_SIZE: int = int(os.getenv("AUTH_USER_CACHE_MAX_SIZE", "10000"))
+    # Trust the signed token claims and skip the user lookup entirely;
+    # revocation then only happens when the token expires.
+    AUTH_STATELESS: bool = os.getenv("AUTH_STATELESS", "false").lower() in ("1", "true", "yes")
+
+    # Executors for CPU-heavy work (see services/executors.py);
+    # *_MAX_PENDING bounds queued + running jobs before requests get a 503.
+    # CPU_* is the query path (index building / scoring), PARSE_* the PDF parsing of uploads.
+    CPU_WORKERS: int = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+    CPU_MAX_PENDING: int = int(os.getenv("CPU_MAX_PENDING", "64"))
+    PARSE_WORKERS: int = int(os.getenv("PARSE_WORKERS", str(max(1, CPU_WORKERS // 2))))
+    PARSE_MAX_PENDING: int = int(os.getenv("PARSE_MAX_PENDING", "32"))
+    HASH_WORKERS: int = int(os.getenv("HASH_WORKERS", "4"))
+    HASH_MAX_PENDING: int = int(os.getenv("HASH_MAX_PENDING", "64"))
+    # PDF parsing slower than this is aborted (the parse worker processes are restarted,
+    # other parses that were running there are resubmitted)
+    PDF_PARSE_TIMEOUT_SECONDS: float = float(os.getenv("PDF_PARSE_TIMEOUT_SECONDS", "120"))
+    SEARCH_WORKERS: int = int(os.getenv("SEARCH_WORKERS", "2"))
+    SEARCH_MAX_PENDING: int = int(os.getenv("SEARCH_MAX_PENDING", "64"))
+
+    # Positional search indexes cached per worker (see services/index.py, rag.IndexCache);
+    # documents added by other workers show up after at most INDEX_SYNC_INTERVAL_SECONDS.
+    INDEX_CACHE_MAX_TENANTS: int = int(os.getenv("INDEX_CACHE_MAX_TENANTS", "64"))
+    INDEX_SYNC_INTERVAL_SECONDS: float = float(os.getenv("INDEX_SYNC_INTERVAL_SECONDS", "2"))
+    # Index snapshots written on shutdown and loaded on startup ("" disables them)
+    INDEX_SNAPSHOT_DIR: str = os.getenv(
+        "INDEX_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "indexes")
+    )
+
+    # Warm start (see services/warmup.py): after startup, load the indexes of the tenants
+    # with the most queries in the last WARMUP_ACTIVITY_DAYS in the background
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+    WARMUP_ACTIVITY_DAYS: int = int(os.getenv("WARMUP_ACTIVITY_DAYS", "7"))
+
+    # Local streaming stand-in for the LLM: delay between emitted tokens
+    LLM_STUB_TOKEN_DELAY_MS: float = float(os.getenv("LLM_STUB_TOKEN_DELAY_MS", "0"))
+
+    # Max tokens of retrieved context packed into the LLM prompt (0 = no limit)
+    PROMPT_CONTEXT_TOKEN_BUDGET: int | None = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "1500")) or None
+
+    # Audit log writer (see services/audit.py)
+    AUDIT_ENABLED: bool = os.getenv("AUDIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    AUDIT_BUFFER_SIZE: int = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+
+    # Per-tenant admission control (see services/scheduler.py); rates are requests/s, 0 = unlimited
+    QUERY_SLOTS: int = int(os.getenv("QUERY_SLOTS", str(2 * CPU_WORKERS)))
+    QUERY_CONCURRENCY_PER_TENANT: int = int(os.getenv("QUERY_CONCURRENCY_PER_TENANT", "4"))
+    QUERY_RATE_PER_TENANT: float = float(os.getenv("QUERY_RATE_PER_TENANT", "20"))
+    QUERY_BURST_PER_TENANT: float = float(os.getenv("QUERY_BURST_PER_TENANT", "40"))
+    QUERY_MAX_QUEUE_PER_TENANT: int = int(os.getenv("QUERY_MAX_QUEUE_PER_TENANT", "32"))
+    INGEST_SLOTS: int = int(os.getenv("INGEST_SLOTS", str(max(1, CPU_WORKERS // 2))))
+    INGEST_CONCURRENCY_PER_TENANT: int = int(os.getenv("INGEST_CONCURRENCY_PER_TENANT", "1"))
+    INGEST_RATE_PER_TENANT: float = float(os.getenv("INGEST_RATE_PER_TENANT", "1"))
+    INGEST_BURST_PER_TENANT: float = float(os.getenv("INGEST_BURST_PER_TENANT", "10"))
+    INGEST_MAX_QUEUE_PER_TENANT: int = int(os.getenv("INGEST_MAX_QUEUE_PER_TENANT", "16"))
+    # "tenant_uuid:weight,..." for weighted fair queueing; unlisted tenants get weight 1
+    TENANT_WEIGHTS: str = os.getenv("TENANT_WEIGHTS", "")
+
 settings = Settings()
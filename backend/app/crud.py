@@ -1,19 +1,23 @@
+from functools import lru_cache
 from typing import List
 from uuid import UUID
-from passlib.context import CryptContext
-from psycopg2.extensions import connection as PGConnection
-from psycopg2.extras import RealDictCursor
+from psycopg import AsyncConnection
 
 # helper functions for the interaction with the database
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib is slow to import; load it with the first hash / verify
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
-def create_tenant(conn: PGConnection, name: str) -> dict:
-    with conn.cursor() as cur:
-        cur.execute(
+async def create_tenant(conn: AsyncConnection, name: str) -> dict:
+    async with conn.cursor() as cur:
+        await cur.execute(
             """
             INSERT INTO tenants (name)
             VALUES (%s)
@@ -21,20 +25,25 @@ def create_tenant(conn: PGConnection, name: str) -> dict:
             """,
             (name,)
         )
-        row = cur.fetchone()
-        conn.commit()
+        row = await cur.fetchone()
+        await conn.commit()
         return row
 
-def list_tenants(conn: PGConnection) -> list[dict]:
-    with conn.cursor() as cur:
-        cur.execute("SELECT id, name FROM tenants ORDER BY created_at;")
-        rows = cur.fetchall()
+async def list_tenants(conn: AsyncConnection) -> list[dict]:
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT id, name FROM tenants ORDER BY created_at;")
+        rows = await cur.fetchall()
         return rows
 
-def create_user(conn: PGConnection, tenant_id: UUID, email: str, password: str, role: str) -> dict:
-    password_hash = hash_password(password)
-    with conn.cursor() as cur:
-        cur.execute(
+async def tenant_exists(conn: AsyncConnection, tenant_id: UUID) -> bool:
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT 1 FROM tenants WHERE id = %s", (str(tenant_id),))
+        return await cur.fetchone() is not None
+
+async def create_user(conn: AsyncConnection, tenant_id: UUID, email: str, password_hash: str, role: str) -> dict:
+    # password_hash from hash_password; hash before borrowing conn (pbkdf2 is slow)
+    async with conn.cursor() as cur:
+        await cur.execute(
             """
             INSERT INTO users (tenant_id, email, password_hash, role)
             VALUES (%s, %s, %s, %s)
@@ -42,14 +51,14 @@ def create_user(conn: PGConnection, tenant_id: UUID, email: str, password: str,
             """,
             (str(tenant_id), email, password_hash, role)
         )
-        row = cur.fetchone()
-        conn.commit()
+        row = await cur.fetchone()
+        await conn.commit()
         return row
 
 
-def get_user_by_email_and_tenant(conn: PGConnection, tenant_id: UUID, email: str) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute(
+async def get_user_by_email_and_tenant(conn: AsyncConnection, tenant_id: UUID, email: str) -> dict | None:
+    async with conn.cursor() as cur:
+        await cur.execute(
             """
             SELECT id, tenant_id, email, password_hash, role
             FROM users
@@ -57,13 +66,13 @@ def get_user_by_email_and_tenant(conn: PGConnection, tenant_id: UUID, email: str
             """,
             (str(tenant_id), email),
         )
-        row = cur.fetchone()
+        row = await cur.fetchone()
         return row
 
 
-def get_user_by_id(conn: PGConnection, user_id: UUID) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute(
+async def get_user_by_id(conn: AsyncConnection, user_id: UUID) -> dict | None:
+    async with conn.cursor() as cur:
+        await cur.execute(
             """
             SELECT id, tenant_id, email, role
             FROM users
@@ -71,5 +80,5 @@ def get_user_by_id(conn: PGConnection, user_id: UUID) -> dict | None:
             """,
             (str(user_id),),
         )
-        row = cur.fetchone()
-        return row
\ No newline at end of file
+        row = await cur.fetchone()
+        return row
@@ -1,10 +1,22 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 from .config import settings
 
-# connection helper for database
+# connection helpers for database
 
 def get_connection():
+    """
+    Blocking psycopg2 connection, for scripts and tooling outside the request path.
+    """
+    # not needed by the API itself, so not imported at startup
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
     conn = psycopg2.connect(
         host=settings.DB_HOST,
         port=settings.DB_PORT,
@@ -14,3 +26,58 @@ def get_connection():
         cursor_factory=RealDictCursor
     )
     return conn
+
+
+# --- async pool used by the API ---
+
+pool: AsyncConnectionPool | None = None
+
+
+def create_pool() -> AsyncConnectionPool:
+    conninfo = make_conninfo(
+        "",
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        dbname=settings.DB_NAME,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+    )
+    return AsyncConnectionPool(
+        conninfo,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        timeout=settings.DB_POOL_TIMEOUT,
+        kwargs={"row_factory": dict_row},
+        open=False,
+    )
+
+
+async def open_pool():
+    global pool
+    if pool is None:
+        pool = create_pool()
+        await pool.open()
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+@asynccontextmanager
+async def connection() -> AsyncIterator[AsyncConnection]:
+    """
+    Borrow a connection from the pool. Commits on success, rolls back on error.
+    """
+    if pool is None:
+        raise RuntimeError("database pool is not open")
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def get_db() -> AsyncIterator[AsyncConnection]:
+    # FastAPI dependency
+    async with connection() as conn:
+        yield conn
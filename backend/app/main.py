@@ -1,16 +1,25 @@
 # backend/app/main.py
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status
-from uuid import UUID
+from uuid import UUID, uuid4
+import json
 import os
 
-from .db import get_connection
+from . import db
+from .db import get_db
 from . import crud, schemas
-from .services.ingestion import ingest_document
+from .services.ingestion import extract_chunks, find_ready_document, ingest_document, reingest_document
 from .services import rag  # <-- NEW
+from .services import audit, executors, warmup
+from .services.executors import ExecutorSaturated, hash_executor, parse_executor
+from .services import scheduler
+from .services.scheduler import TenantThrottled, ingest_scheduler, query_scheduler
 from .services.auth import authenticate_user, create_access_token, get_current_user
 from datetime import timedelta
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from psycopg_pool import PoolTimeout
 
 from . import schemas
 from .schemas import UserOut
@@ -22,7 +31,26 @@ os.makedirs(DOCUMENTS_DIR, exist_ok=True)
 
 # contains the actual fast api app
 
-app = FastAPI(title="Company LLM Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.warm_up.begin()
+    await db.open_pool()
+    executors.start_all()
+    await audit.audit_log.start()
+    # serve right away, tenant indexes are loaded in the background
+    warmup.warm_up.start()
+    try:
+        yield
+    finally:
+        await warmup.warm_up.stop()
+        await rag.index_cache.save_dirty()
+        rag.index_cache.clear()
+        await audit.audit_log.stop()
+        executors.shutdown_all()
+        await db.close_pool()
+
+
+app = FastAPI(title="Company LLM Backend", lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -37,32 +65,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_db():
-    conn = get_connection()
-    try:
-        yield conn
-    finally:
-        conn.close()
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": f"Server busy ({exc.name}), please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc: PoolTimeout):
+    # every pooled connection stayed busy for DB_POOL_TIMEOUT seconds
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy (database), please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(TenantThrottled)
+async def tenant_throttled_handler(request, exc: TenantThrottled):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": f"Too many requests ({exc.name}: {exc.reason})", "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "executors": executors.stats(),
+        "scheduler": scheduler.stats(),
+        "audit": audit.audit_log.stats(),
+        "index": rag.index_cache.stats(),
+        "warmup": warmup.warm_up.stats(),
+    }
+
 @app.post("/tenants", response_model=schemas.TenantOut)
-def create_tenant(tenant: schemas.TenantCreate, conn=Depends(get_db)):
-    row = crud.create_tenant(conn, tenant.name)
+async def create_tenant(tenant: schemas.TenantCreate, conn=Depends(get_db)):
+    row = await crud.create_tenant(conn, tenant.name)
     return row
 
 @app.get("/tenants", response_model=List[schemas.TenantOut])
-def list_tenants(conn=Depends(get_db)):
-    rows = crud.list_tenants(conn)
+async def list_tenants(conn=Depends(get_db)):
+    rows = await crud.list_tenants(conn)
     return rows
 
 @app.post("/users", response_model=schemas.UserOut)
-def create_user(user: schemas.UserCreate, conn=Depends(get_db)):
+async def create_user(user: schemas.UserCreate):
     try:
-        row = crud.create_user(conn, user.tenant_id, user.email, user.password, user.role)
+        # pbkdf2 is CPU-bound: hash off the event loop, before taking a pooled connection
+        password_hash = await hash_executor.run(crud.hash_password, user.password)
+        async with db.connection() as conn:
+            row = await crud.create_user(conn, user.tenant_id, user.email, password_hash, user.role)
         return row
+    except (ExecutorSaturated, PoolTimeout):
+        raise
     except Exception as e:
         # minimal error handling for now
         raise HTTPException(status_code=400, detail=str(e))
@@ -71,7 +132,6 @@ def create_user(user: schemas.UserCreate, conn=Depends(get_db)):
 async def upload_document(
     file: UploadFile = File(...),
     current_user: schemas.UserOut = Depends(get_current_user),
-    conn = Depends(get_db),
 ):
     """
     Upload a document for a given tenant.
@@ -79,6 +139,9 @@ async def upload_document(
     - Saves the file to local storage
     - Inserts a row into documents
     - Runs ingestion (extract + chunk + dummy embeddings)
+
+    If the tenant already has a ready document with this filename, the upload becomes
+    its next version instead: only changed chunks are written (see reingest_document).
     """
     # get tenant id from current user
     tenant_id = current_user.tenant_id
@@ -87,138 +150,279 @@ async def upload_document(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
 
-    # 1. Save file to disk
-    # document_id will be known after insert; for now we use a temp name
-    original_filename = file.filename
-    # use a temp path; we'll rename once document_id is known
-    temp_path = os.path.join(DOCUMENTS_DIR, f"temp_{original_filename}")
-    with open(temp_path, "wb") as f_out:
-        content = await file.read()
-        f_out.write(content)
-
-    # 2. Create document row
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO documents (tenant_id, title, original_filename, storage_path, status)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id;
-            """,
-            (
-                str(tenant_id),
-                original_filename,  # title = original filename for now
-                original_filename,
-                "",  # temporary placeholder for storage_path, we'll update
-                "uploaded",
-            ),
-        )
-        row = cur.fetchone()
-        document_id = row["id"]
-
-        # Now that we know the document_id, compute final storage path
-        final_filename = f"{document_id}_{original_filename}"
-        final_path = os.path.join(DOCUMENTS_DIR, final_filename)
-
-        # Rename temp file to final path
-        os.rename(temp_path, final_path)
-
-        # Update storage_path in DB
-        cur.execute(
-            """
-            UPDATE documents
-            SET storage_path = %s
-            WHERE id = %s
-            """,
-            (final_path, str(document_id)),
+    # Per-tenant admission + fair share of the ingestion workers (429 if over the limit)
+    async with ingest_scheduler.slot(tenant_id):
+        # 1. Save file to disk
+        # document_id will be known after insert; for now we use a temp name
+        original_filename = file.filename
+        # use a temp path; we'll rename once document_id is known
+        # (unique: the same filename may be uploaded again while this one is processed)
+        temp_path = os.path.join(DOCUMENTS_DIR, f"temp_{uuid4().hex}_{original_filename}")
+        with open(temp_path, "wb") as f_out:
+            content = await file.read()
+            f_out.write(content)
+
+        async with db.connection() as conn:
+            existing = await find_ready_document(conn, tenant_id, original_filename)
+        if existing is not None:
+            return await upload_new_version(current_user, existing["id"], original_filename, temp_path)
+
+        # 2. Create document row
+        async with db.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO documents (tenant_id, title, original_filename, storage_path, status)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id;
+                    """,
+                    (
+                        str(tenant_id),
+                        original_filename,  # title = original filename for now
+                        original_filename,
+                        "",  # temporary placeholder for storage_path, we'll update
+                        "uploaded",
+                    ),
+                )
+                row = await cur.fetchone()
+                document_id = row["id"]
+
+                # Now that we know the document_id, compute final storage path
+                final_filename = f"{document_id}_{original_filename}"
+                final_path = os.path.join(DOCUMENTS_DIR, final_filename)
+
+                # Rename temp file to final path
+                os.rename(temp_path, final_path)
+
+                # Update storage_path in DB
+                await cur.execute(
+                    """
+                    UPDATE documents
+                    SET storage_path = %s
+                    WHERE id = %s
+                    """,
+                    (final_path, str(document_id)),
+                )
+
+            await conn.commit()
+
+        # 3. Ingest document: parse + chunk off the event loop, no connection held meanwhile
+        try:
+            chunks = await parse_executor.run(extract_chunks, final_path, timeout=settings.PDF_PARSE_TIMEOUT_SECONDS)
+            async with db.connection() as conn:
+                await ingest_document(conn, tenant_id, document_id, chunks)
+        except Exception as e:
+            # If ingestion fails, mark document as error
+            async with db.connection() as conn:
+                await conn.execute(
+                    """
+                    UPDATE documents
+                    SET status = 'error'
+                    WHERE id = %s
+                    """,
+                    (str(document_id),),
+                )
+                await conn.commit()
+            audit.record(
+                "upload", tenant_id, current_user.id,
+                document_id=str(document_id), filename=original_filename, status="error",
+            )
+            if isinstance(e, ExecutorSaturated):
+                raise
+            raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+
+        rag.index_cache.mark_stale(tenant_id)
+        audit.record(
+            "upload", tenant_id, current_user.id,
+            document_id=str(document_id), filename=original_filename, status="ready", chunks=len(chunks),
         )
 
-    conn.commit()
+    return {
+        "document_id": document_id,
+        "tenant_id": tenant_id,
+        "filename": original_filename,
+        "status": "ready",
+        "version": 1,
+    }
 
-    # 3. Ingest document (sync for now)
+
+async def upload_new_version(
+    current_user: schemas.UserOut,
+    document_id: UUID,
+    original_filename: str,
+    temp_path: str,
+) -> dict:
+    """
+    Ingest an uploaded file as the next version of an existing document.
+    The previous version stays in place (file, chunks, status) if anything fails.
+    """
+    tenant_id = current_user.tenant_id
+    final_path = os.path.join(DOCUMENTS_DIR, f"{document_id}_{original_filename}")
     try:
-        ingest_document(conn, tenant_id, document_id, final_path)
+        chunks = await parse_executor.run(
+            extract_chunks, temp_path, os.path.basename(final_path), timeout=settings.PDF_PARSE_TIMEOUT_SECONDS
+        )
+        async with db.connection() as conn:
+            changes = await reingest_document(conn, tenant_id, document_id, chunks)
     except Exception as e:
-        # If ingestion fails, mark document as error
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE documents
-                SET status = 'error'
-                WHERE id = %s
-                """,
-                (str(document_id),),
-            )
-        conn.commit()
+        os.remove(temp_path)
+        audit.record(
+            "upload", tenant_id, current_user.id,
+            document_id=str(document_id), filename=original_filename, status="error", new_version=True,
+        )
+        if isinstance(e, ExecutorSaturated):
+            raise
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
 
+    os.replace(temp_path, final_path)
+    rag.index_cache.mark_stale(tenant_id)
+    audit.record(
+        "upload", tenant_id, current_user.id,
+        document_id=str(document_id), filename=original_filename, status="ready", **changes,
+    )
     return {
         "document_id": document_id,
         "tenant_id": tenant_id,
         "filename": original_filename,
         "status": "ready",
+        **changes,
     }
 
 
+NO_HITS_ANSWER = "Ich konnte keine passenden Informationen in den Dokumenten finden."
+
+
+async def retrieve_hits(
+    tenant_id: UUID,
+    question: str,
+    top_k: int,
+    filters: Optional[schemas.QueryFilters] = None,
+) -> List[dict]:
+    """
+    Retrieve relevant chunks via the hybrid lexical search over the tenant's
+    positional index (quoted phrases / proximity supported, filters applied in the index).
+    Runs under the tenant's query scheduler slot (429 if over the limit).
+    """
+    async with query_scheduler.slot(tenant_id):
+        return await rag.retrieve_relevant_chunks_lexical(tenant_id, question, top_k, filters)
+
+
+def hits_to_sources(hits: List[dict], full_text: bool = False) -> List[schemas.SourceChunk]:
+    # Map hits to SourceChunk for frontend: the highlighted snippet, or the whole chunk
+    return [
+        schemas.SourceChunk(
+            document_id=h["document_id"],
+            chunk_index=h["chunk_index"],
+            text=h["text"] if full_text else h["snippet"],
+            highlights=[] if full_text else h["highlights"],
+        )
+        for h in hits
+    ]
+
+
 @app.post("/query", response_model=schemas.QueryResponse)
-def query_data(
+async def query_data(
     payload: schemas.QueryRequest,
     current_user: schemas.UserOut = Depends(get_current_user),
-    conn = Depends(get_db),
 ):
     """
     Ask a question about a tenant's documents using lexical BM25 + TF-IDF retrieval.
     """
-    tenant_id = current_user.tenant_id
     question = payload.question
-    top_k = payload.top_k
 
-    # 1. Retrieve relevant chunks via your hybrid lexical search
-    hits = rag.retrieve_relevant_chunks_lexical(conn, tenant_id, question, top_k=top_k)
+    # 1. Retrieve relevant chunks
+    hits = await retrieve_hits(current_user.tenant_id, question, payload.top_k, payload.filters)
+    audit.record(
+        "query", current_user.tenant_id, current_user.id,
+        question=question, top_k=payload.top_k, hits=len(hits), filtered=payload.filters is not None,
+    )
 
     if not hits:
-        return schemas.QueryResponse(
-            answer="Ich konnte keine passenden Informationen in den Dokumenten finden.",
-            sources=[],
-        )
+        return schemas.QueryResponse(answer=NO_HITS_ANSWER, sources=[])
 
     # 2. Build prompt from hits (your build_prompt)
     prompt = rag.build_rag_prompt(question, hits)
 
     # 3. Call LLM (dummy for now)
-    answer = rag.call_llm(prompt)
-
-    # 4. Map hits to SourceChunk for frontend
-    sources = [
-        schemas.SourceChunk(
-            document_id=h["document_id"],
-            chunk_index=h["chunk_index"],
-            text=h["text"],
-        )
-        for h in hits
-    ]
+    answer = await rag.call_llm(prompt)
 
     return schemas.QueryResponse(
         answer=answer,
-        sources=sources,
+        sources=hits_to_sources(hits, payload.full_text),
+    )
+
+
+def sse_event(event: str, data) -> str:
+    # data is JSON-encoded so multi-line answers stay within one "data:" line
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/query/stream")
+async def query_data_stream(
+    payload: schemas.QueryRequest,
+    current_user: schemas.UserOut = Depends(get_current_user),
+):
+    """
+    Streaming variant of /query as Server-Sent Events:
+
+    - event "sources": the retrieved chunks, sent as soon as retrieval finishes
+    - event "token":   {"text": ...} answer deltas as the LLM produces them
+    - event "done":    end of stream ("error" with {"detail": ...} if the LLM fails)
+    """
+    question = payload.question
+    hits = await retrieve_hits(current_user.tenant_id, question, payload.top_k, payload.filters)
+    audit.record(
+        "query", current_user.tenant_id, current_user.id,
+        question=question, top_k=payload.top_k, hits=len(hits),
+        filtered=payload.filters is not None, stream=True,
+    )
+    sources = [s.model_dump(mode="json") for s in hits_to_sources(hits, payload.full_text)]
+
+    async def events():
+        yield sse_event("sources", sources)
+        if not hits:
+            yield sse_event("token", {"text": NO_HITS_ANSWER})
+            yield sse_event("done", {})
+            return
+        prompt = rag.build_rag_prompt(question, hits)
+        try:
+            async for token in rag.stream_llm(prompt):
+                yield sse_event("token", {"text": token})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"LLM failed: {e}"})
+            return
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.post("/auth/login", response_model=schemas.Token)
-def login(payload: schemas.UserLogin):
+async def login(payload: schemas.UserLogin):
     """
     Login endpoint.
 
     Expects: tenant_id, email, password.
     Returns: JWT access token if credentials are valid.
     """
-    user = authenticate_user(payload.tenant_id, payload.email, payload.password)
+    user = await authenticate_user(payload.tenant_id, payload.email, payload.password)
     if not user:
+        # failed attempts are audited too; only for real tenants (audit_logs references tenants)
+        async with db.connection() as conn:
+            known_tenant = await crud.tenant_exists(conn, payload.tenant_id)
+        if known_tenant:
+            audit.record("login", payload.tenant_id, None, email=payload.email, success=False)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect tenant, email, or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    audit.record("login", user["tenant_id"], user["id"], email=user["email"], success=True)
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List
 from uuid import UUID
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 # pydantic models for request / response bodies
 
@@ -26,14 +26,38 @@ class UserOut(BaseModel):
 
 from typing import List
 
+class PageRange(BaseModel):
+    start: int = Field(ge=1)
+    end: Optional[int] = Field(default=None, ge=1)  # inclusive; None = only `start`
+
+class QueryFilters(BaseModel):
+    # all set filters must match (AND); list values match any entry (OR)
+    document_ids: Optional[List[UUID]] = None
+    filenames: Optional[List[str]] = None  # original upload filenames
+    pages: Optional[List[PageRange]] = None
+    # upload time of the document's current version (a new version moves it)
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+    @field_validator("uploaded_after", "uploaded_before")
+    @classmethod
+    def _naive_is_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # naive values are UTC, for SQL and the in-memory index alike
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
 class QueryRequest(BaseModel):
     question: str
     top_k: int = 5  # how many chunks to retrieve
+    filters: Optional[QueryFilters] = None  # restrict retrieval before scoring
+    full_text: bool = False  # sources carry the whole chunk instead of a snippet
 
 class SourceChunk(BaseModel):
     document_id: UUID
     chunk_index: int
-    text: str
+    text: str  # snippet around the matches unless full_text was requested
+    highlights: List[List[int]] = []  # [start, end) character ranges of matches in text
 
 class QueryResponse(BaseModel):
     answer: str
@@ -0,0 +1,151 @@
+# backend/app/services/audit.py
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from psycopg import InterfaceError, OperationalError
+from psycopg.types.json import Jsonb
+from psycopg_pool import PoolTimeout
+
+from ..config import settings
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+# Buffered writer for the audit_logs table.
+# Requests only append to an in-memory buffer; a background task writes the
+# buffer in bulk (COPY) whenever AUDIT_BATCH_SIZE events are waiting or every
+# AUDIT_FLUSH_INTERVAL_SECONDS. When the buffer is full, new events are dropped
+# and counted instead of slowing down the request path.
+# COPY is all-or-nothing: a batch rejected for its data (e.g. an event of a tenant
+# or user deleted before the flush) is retried in halves, so only the offending
+# events are dropped (counted as failed).
+
+AuditEvent = Tuple[str, Optional[str], str, Dict[str, Any], datetime]
+
+
+class AuditLogWriter:
+    def __init__(self, capacity: int, batch_size: int, flush_interval: float):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: Deque[AuditEvent] = deque()
+        self._wake: asyncio.Event | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def log(self, tenant_id: UUID | str, user_id: UUID | str | None, action: str, details: Dict[str, Any] | None = None):
+        """
+        Queue one event. Never blocks and never raises on the request path.
+        """
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return
+        self._buffer.append(
+            (
+                str(tenant_id),
+                str(user_id) if user_id is not None else None,
+                action,
+                details or {},
+                datetime.now(timezone.utc),
+            )
+        )
+        self.enqueued += 1
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    async def start(self):
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write whatever is still buffered.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._buffer:
+                n = min(self.batch_size, len(self._buffer))
+                batch = [self._buffer.popleft() for _ in range(n)]
+                await self._write_isolating(batch)
+                self.flushes += 1
+
+    async def _write_isolating(self, batch: List[AuditEvent]):
+        try:
+            await self._write(batch)
+            self.written += len(batch)
+        except (PoolTimeout, OperationalError, InterfaceError):
+            # the database is unreachable, splitting won't help; don't block later events
+            self.failed += len(batch)
+            logger.exception("audit log flush failed, %d events lost", len(batch))
+        except Exception:
+            if len(batch) == 1:
+                self.failed += 1
+                tenant_id, user_id, action, _, _ = batch[0]
+                logger.exception("audit event %s (tenant %s, user %s) rejected, dropped", action, tenant_id, user_id)
+                return
+            mid = len(batch) // 2
+            await self._write_isolating(batch[:mid])
+            await self._write_isolating(batch[mid:])
+
+    async def _write(self, batch):
+        async with db.connection() as conn:
+            async with conn.cursor() as cur:
+                async with cur.copy(
+                    "COPY audit_logs (tenant_id, user_id, action, details, created_at) FROM STDIN"
+                ) as copy:
+                    for tenant_id, user_id, action, details, created_at in batch:
+                        await copy.write_row((tenant_id, user_id, action, Jsonb(details), created_at))
+            await conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+audit_log = AuditLogWriter(
+    capacity=settings.AUDIT_BUFFER_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+)
+
+
+def record(action: str, tenant_id: UUID | str, user_id: UUID | str | None = None, **details: Any):
+    if settings.AUDIT_ENABLED:
+        audit_log.log(tenant_id, user_id, action, details)
@@ -1,26 +1,91 @@
 # backend/app/services/auth.py
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
 
 from ..config import settings
 from .. import crud, schemas
-from ..db import get_connection
+from ..crud import get_pwd_context
+from .. import db
+from .executors import hash_executor
 
 security = HTTPBearer()
 
+
+class UserCache:
+    """
+    Size-bounded LRU cache of users with a TTL, keyed by user id.
+    Lives per worker process; entries expire after `ttl` seconds, so a change made
+    elsewhere is picked up within that window even without explicit invalidation.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[UUID, Tuple[float, schemas.UserOut]]" = OrderedDict()
+
+    def get(self, user_id: UUID) -> schemas.UserOut | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def put(self, user: schemas.UserOut):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: UUID):
+        self._entries.pop(user_id, None)
+
+    def invalidate_tenant(self, tenant_id: UUID):
+        for uid in [uid for uid, (_, u) in self._entries.items() if u.tenant_id == tenant_id]:
+            del self._entries[uid]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+user_cache = UserCache(
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    max_size=settings.AUTH_USER_CACHE_MAX_SIZE,
+)
+
+
+# invalidation hooks: call these after changing a user's role or deleting a user / tenant
+
+def invalidate_user(user_id: UUID | str):
+    user_cache.invalidate(UUID(str(user_id)))
+
+
+def invalidate_tenant_users(tenant_id: UUID | str):
+    user_cache.invalidate_tenant(UUID(str(tenant_id)))
+
+
 def verify_password(plain_password: str, password_hash: str) -> bool:
     # reuse the same passlib context as in crud.py
-    from . import rag  # hacky import just to avoid circular import; or copy pwd_context from crud
-    # Actually better: import from crud directly:
-    from ..crud import pwd_context
-    return pwd_context.verify(plain_password, password_hash)
+    return get_pwd_context().verify(plain_password, password_hash)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt  # deferred heavy import, see warmup.warm_imports
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -31,22 +96,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def authenticate_user(tenant_id, email, password) -> dict | None:
-    conn = get_connection()
-    try:
-        user = crud.get_user_by_email_and_tenant(conn, tenant_id, email)
-        if not user:
-            return None
-        if not verify_password(password, user["password_hash"]):
-            return None
-        return user
-    finally:
-        conn.close()
+async def authenticate_user(tenant_id, email, password) -> dict | None:
+    async with db.connection() as conn:
+        user = await crud.get_user_by_email_and_tenant(conn, tenant_id, email)
+    if not user:
+        return None
+    # pbkdf2 is CPU-bound, keep it off the event loop
+    if not await hash_executor.run(verify_password, password, user["password_hash"]):
+        return None
+    return user
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> schemas.UserOut:
+    from jose import JWTError, jwt  # deferred heavy import, see warmup.warm_imports
+
     token = credentials.credentials
 
     credentials_exception = HTTPException(
@@ -71,17 +136,28 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    conn = get_connection()
-    try:
-        user_row = crud.get_user_by_id(conn, token_data.user_id)
-        if not user_row:
-            raise credentials_exception
+    if settings.AUTH_STATELESS:
+        # signed claims are trusted as-is (role/tenant were set at login)
         return schemas.UserOut(
-            id=user_row["id"],
-            tenant_id=user_row["tenant_id"],
-            email=user_row["email"],
-            role=user_row["role"],
+            id=token_data.user_id,
+            tenant_id=token_data.tenant_id,
+            email=token_data.email,
+            role=token_data.role or "user",
         )
-    finally:
-        conn.close()
 
+    user = user_cache.get(token_data.user_id)
+    if user is not None:
+        return user
+
+    async with db.connection() as conn:
+        user_row = await crud.get_user_by_id(conn, token_data.user_id)
+    if not user_row:
+        raise credentials_exception
+    user = schemas.UserOut(
+        id=user_row["id"],
+        tenant_id=user_row["tenant_id"],
+        email=user_row["email"],
+        role=user_row["role"],
+    )
+    user_cache.put(user)
+    return user
@@ -6,8 +6,6 @@ from collections import Counter
 from pathlib import Path
 from typing import List, Dict, Any
 
-from PyPDF2 import PdfReader
-
 
 # --- Basic PDF reading ---
 
@@ -15,6 +13,9 @@ def read_pdf_text_by_page(pdf_path: str | Path) -> List[str]:
     """
     Read a PDF file and return a list of page texts.
     """
+    # imported on first use: only the cpu worker processes ever parse PDFs
+    from PyPDF2 import PdfReader
+
     path = Path(pdf_path)
     reader = PdfReader(str(path))
     pages: List[str] = []
@@ -39,7 +40,13 @@ def simple_normalize(text: str) -> List[str]:
     return tokens
 
 
-def chunk_text(text: str, max_tokens: int = 220, overlap: int = 40) -> List[str]:
+# chunk window geometry used at ingestion: consecutive chunks of a page share
+# exactly CHUNK_OVERLAP tokens (merge_adjacent_hits relies on that)
+CHUNK_MAX_TOKENS = 220
+CHUNK_OVERLAP = 40
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
     Chunk text based on tokens into overlapping windows.
     Returns token-joined strings (already normalized).
@@ -167,11 +174,141 @@ def hybrid_search(
     return out
 
 
+# --- Context assembly ---
+
+def _count_tokens(text: str) -> int:
+    # chunk texts are already normalized, space-joined tokens
+    return len(text.split())
+
+
+def _overlap_len(a: List[str], b: List[str], overlap: int = CHUNK_OVERLAP) -> int:
+    """
+    Number of tokens b repeats from the end of a: the chunk_text overlap if the
+    last `overlap` tokens of a are exactly the first ones of b, else 0.
+    Never searches for a longer match; on repetitive text (forms, tables) that
+    would swallow real content.
+    """
+    k = min(overlap, len(a), len(b))
+    return k if k and a[-k:] == b[:k] else 0
+
+
+def merge_adjacent_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Stitch hits of the same document with consecutive chunk_index into one span.
+    chunk_text windows on the same page overlap, so the duplicated tokens are dropped.
+    Each span: {document_id, filename, page, chunk_indices, text, score (max of members),
+    members: [(start_token, end_token, score)] for trimming in pack_context}.
+    """
+    by_doc: Dict[Any, List[Dict[str, Any]]] = {}
+    for h in hits:
+        by_doc.setdefault(h.get("document_id"), []).append(h)
+
+    spans: List[Dict[str, Any]] = []
+    for doc_hits in by_doc.values():
+        doc_hits = sorted(doc_hits, key=lambda h: h.get("chunk_index", 0))
+        current: Dict[str, Any] | None = None
+        for h in doc_hits:
+            tokens = (h.get("text") or "").split()
+            score = h.get("score", 0.0)
+            if current is not None and h.get("chunk_index") == current["chunk_indices"][-1] + 1:
+                start = len(current["tokens"])
+                if h.get("page") == current["last_page"]:
+                    start -= _overlap_len(current["tokens"], tokens)
+                    tokens = tokens[len(current["tokens"]) - start:]
+                current["tokens"].extend(tokens)
+                current["members"].append((start, len(current["tokens"]), score))
+                current["chunk_indices"].append(h.get("chunk_index"))
+                current["last_page"] = h.get("page")
+                current["score"] = max(current["score"], score)
+                continue
+            current = {
+                "document_id": h.get("document_id"),
+                "filename": h.get("filename", "unknown"),
+                "first_page": h.get("page", "?"),
+                "last_page": h.get("page", "?"),
+                "chunk_indices": [h.get("chunk_index")],
+                "tokens": tokens,
+                "members": [(0, len(tokens), score)],
+                "score": score,
+            }
+            spans.append(current)
+
+    out: List[Dict[str, Any]] = []
+    for sp in spans:
+        first, last = sp.pop("first_page"), sp.pop("last_page")
+        sp["page"] = first if first == last else f"{first}-{last}"
+        sp["text"] = " ".join(sp.pop("tokens"))
+        out.append(sp)
+    return out
+
+
+def _trim_span(sp: Dict[str, Any], budget: int) -> Dict[str, Any] | None:
+    """
+    Cut a span down to the run of member chunks around its best-scoring one
+    that still fits into budget tokens (None if not even that chunk fits).
+    """
+    members = sp.get("members") or [(0, _count_tokens(sp["text"]), sp["score"])]
+    best = max(range(len(members)), key=lambda i: members[i][2])
+    lo = hi = best
+    if members[best][1] - members[best][0] > budget:
+        return None
+    while True:
+        candidates = [i for i in (lo - 1, hi + 1) if 0 <= i < len(members)]
+        candidates.sort(key=lambda i: members[i][2], reverse=True)
+        for i in candidates:
+            new_lo, new_hi = min(lo, i), max(hi, i)
+            if members[new_hi][1] - members[new_lo][0] <= budget:
+                lo, hi = new_lo, new_hi
+                break
+        else:
+            break
+
+    tokens = sp["text"].split()
+    trimmed = dict(sp)
+    trimmed["text"] = " ".join(tokens[members[lo][0] : members[hi][1]])
+    trimmed["chunk_indices"] = sp["chunk_indices"][lo : hi + 1]
+    trimmed["members"] = [(a - members[lo][0], b - members[lo][0], sc) for a, b, sc in members[lo : hi + 1]]
+    return trimmed
+
+
+def pack_context(spans: List[Dict[str, Any]], token_budget: int | None) -> List[Dict[str, Any]]:
+    """
+    Greedily pick spans by score until the token budget is used up.
+    A span that doesn't fit is trimmed to its best chunks, or skipped (a smaller
+    one further down may still fit); if nothing fits at all, the best span is
+    truncated so the context is never empty.
+    """
+    ranked = sorted(spans, key=lambda sp: sp["score"], reverse=True)
+    if token_budget is None:
+        return ranked
+
+    packed: List[Dict[str, Any]] = []
+    used = 0
+    for sp in ranked:
+        n = _count_tokens(sp["text"])
+        if used + n > token_budget:
+            sp = _trim_span(sp, token_budget - used)
+            if sp is None:
+                continue
+            n = _count_tokens(sp["text"])
+        packed.append(sp)
+        used += n
+    if not packed and ranked and token_budget > 0:
+        best = dict(ranked[0])
+        best["text"] = " ".join(best["text"].split()[:token_budget])
+        packed.append(best)
+    return packed
+
+
 # --- Prompt building ---
 
-def build_prompt(user_q: str, hits: List[Dict[str, Any]]) -> str:
+def build_prompt(user_q: str, hits: List[Dict[str, Any]], token_budget: int | None = None) -> str:
+    """
+    Build the LLM prompt; overlapping neighbour chunks are merged and the
+    context is packed into token_budget tokens (no limit if None).
+    """
     blocks = []
-    for i, h in enumerate(hits, 1):
+    for i, h in enumerate(pack_context(merge_adjacent_hits(hits), token_budget), 1):
         filename = h.get("filename", "unknown")
         page = h.get("page", "?")
         score = h.get("score", 0.0)
@@ -0,0 +1,198 @@
+# backend/app/services/executors.py
+
+import asyncio
+import logging
+import multiprocessing
+import weakref
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+from ..config import settings
+
+# Dedicated, separately sized executors for CPU-heavy work, so that a burst of
+# logins or uploads cannot starve the threadpool that serves everything else.
+#
+# - cpu_executor:    process pool for the query path: index building and scoring
+#                    of tenants without a cached index
+# - parse_executor:  process pool for PDF parsing/chunking of uploads, so an upload
+#                    burst never queues in front of (or crowds out) queries
+# - hash_executor:   thread pool for password hashing (hashlib releases the GIL)
+# - search_executor: thread pool for searching the in-memory tenant indexes
+#                    (they live in this process, so a process pool is no option)
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when an executor already has max_pending jobs queued or running.
+    Mapped to 503 + Retry-After in main.py.
+    """
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} executor is saturated")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Wraps a concurrent.futures executor with a cap on pending jobs (backpressure)
+    and simple queue-depth counters.
+
+    A process pool whose worker died (segfault, OOM kill) is broken for good;
+    it is thrown away and the next job starts a fresh one. Jobs can get a timeout;
+    on a process pool a timed-out job's workers are killed the same way. The other
+    jobs of a pool killed like that fail through no fault of their own and are
+    resubmitted to the new pool (jobs must be safe to run twice).
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Executor], workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._factory = factory
+        self._executor: Executor | None = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+        self.resubmitted = 0
+        # executors terminated on purpose (a timeout), as opposed to ones that broke
+        self._killed: "weakref.WeakSet[Executor]" = weakref.WeakSet()
+
+    def start(self):
+        if self._executor is None:
+            self._executor = self._factory()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _discard(self, executor: Executor, kill: bool = False):
+        if self._executor is not executor:
+            return  # already replaced by a concurrent failure
+        self._executor = None
+        self.restarts += 1
+        if kill and isinstance(executor, ProcessPoolExecutor):
+            # no public API to stop a running job; terminate the pool's workers.
+            # The pool then fails all its other jobs with BrokenProcessPool (not
+            # cancelled: run() tells them apart from a worker that died by itself).
+            self._killed.add(executor)
+            for proc in list((getattr(executor, "_processes", None) or {}).values()):
+                proc.terminate()
+        executor.shutdown(wait=False)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: float | None = None) -> Any:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(self.name, retry_after=1)
+        self.pending += 1
+        self.submitted += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            while True:
+                self.start()
+                executor = self._executor
+                try:
+                    result = await asyncio.wait_for(
+                        asyncio.get_running_loop().run_in_executor(executor, fn, *args), timeout
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    self.failed += 1
+                    self.timed_out += 1
+                    logger.warning(
+                        "%s executor: %s timed out after %ss", self.name, getattr(fn, "__name__", fn), timeout
+                    )
+                    self._discard(executor, kill=True)
+                    raise
+                except BrokenExecutor:
+                    if executor in self._killed:
+                        # another job's timeout killed the pool; run this one again (full timeout)
+                        self.resubmitted += 1
+                        continue
+                    self.failed += 1
+                    logger.warning("%s executor is broken (worker died), starting a new one", self.name)
+                    self._discard(executor)
+                    raise
+                except Exception:
+                    self.failed += 1
+                    raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.workers),
+            "peak_pending": self.peak_pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "restarts": self.restarts,
+            "resubmitted": self.resubmitted,
+        }
+
+
+cpu_executor = BoundedExecutor(
+    "cpu",
+    lambda: ProcessPoolExecutor(
+        max_workers=settings.CPU_WORKERS,
+        # spawn: don't fork a process that already runs an event loop and threads
+        mp_context=multiprocessing.get_context("spawn"),
+    ),
+    workers=settings.CPU_WORKERS,
+    max_pending=settings.CPU_MAX_PENDING,
+)
+
+parse_executor = BoundedExecutor(
+    "parse",
+    lambda: ProcessPoolExecutor(
+        max_workers=settings.PARSE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    ),
+    workers=settings.PARSE_WORKERS,
+    max_pending=settings.PARSE_MAX_PENDING,
+)
+
+hash_executor = BoundedExecutor(
+    "hash",
+    lambda: ThreadPoolExecutor(max_workers=settings.HASH_WORKERS, thread_name_prefix="hash"),
+    workers=settings.HASH_WORKERS,
+    max_pending=settings.HASH_MAX_PENDING,
+)
+
+search_executor = BoundedExecutor(
+    "search",
+    lambda: ThreadPoolExecutor(max_workers=settings.SEARCH_WORKERS, thread_name_prefix="search"),
+    workers=settings.SEARCH_WORKERS,
+    max_pending=settings.SEARCH_MAX_PENDING,
+)
+
+ALL = (cpu_executor, parse_executor, hash_executor, search_executor)
+
+
+def start_all():
+    for ex in ALL:
+        ex.start()
+
+
+def shutdown_all():
+    for ex in ALL:
+        ex.shutdown()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {ex.name: ex.stats() for ex in ALL}
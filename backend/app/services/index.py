@@ -0,0 +1,481 @@
+# backend/app/services/index.py
+
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .chunking import simple_normalize
+
+logger = logging.getLogger(__name__)
+
+# Positional inverted index over a tenant's chunks.
+#
+# postings[term][slot] = (tf, positions) with positions delta + varint encoded.
+# One slot per chunk; each document keeps the list of its slots, so per-document
+# filters map to slot lists. Scoring mirrors chunking.hybrid_search
+# (BM25 + TF-IDF cosine), but only touches chunks that contain a query term.
+# A filtered search scores with the statistics (N, df, avgdl) of the filtered
+# subset, the same as rag's cold path that indexes only the rows matching the filters.
+#
+# Query syntax: plain words, "exact phrase", "proximity phrase"~N
+# (all words within a window of len(words) + N tokens, any order).
+
+SNIPPET_TOKENS = 30
+
+# bump when TenantIndex's layout changes; older snapshots are then rebuilt from the DB
+SNAPSHOT_FORMAT = 1
+
+# dropped chunks leave dead slots behind; renumber once they are more than this share
+COMPACT_DEAD_SHARE = 0.25
+
+_PHRASE_RE = re.compile(r'"([^"]+)"(?:~(\d+))?')
+
+
+# --- delta + varint encoding ---
+
+def encode_positions(positions: Iterable[int]) -> bytes:
+    out = bytearray()
+    prev = 0
+    for p in positions:
+        delta = p - prev
+        prev = p
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_positions(data: bytes) -> List[int]:
+    out: List[int] = []
+    value = shift = prev = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        prev += value
+        out.append(prev)
+        value = shift = 0
+    return out
+
+
+# --- query parsing ---
+
+def parse_query(question: str) -> Tuple[List[str], List[Tuple[List[str], int]]]:
+    """
+    Split a question into all query tokens and the quoted phrases [(tokens, slop)].
+    """
+    phrases: List[Tuple[List[str], int]] = []
+    for m in _PHRASE_RE.finditer(question):
+        tokens = simple_normalize(m.group(1))
+        if tokens:
+            phrases.append((tokens, int(m.group(2) or 0)))
+    tokens = simple_normalize(_PHRASE_RE.sub(" ", question))
+    for phrase_tokens, _ in phrases:
+        tokens.extend(phrase_tokens)
+    return tokens, phrases
+
+
+def _phrase_match(positions: List[List[int]], slop: int) -> bool:
+    if slop == 0:
+        # exact phrase: word i at start + i
+        rest = [set(p) for p in positions[1:]]
+        return any(all(start + i + 1 in ps for i, ps in enumerate(rest)) for start in positions[0])
+    # proximity: smallest window containing every word
+    events = sorted((p, i) for i, ps in enumerate(positions) for p in ps)
+    need = len(positions)
+    counts: Counter = Counter()
+    left = 0
+    for right, (pos, term) in enumerate(events):
+        counts[term] += 1
+        while len(counts) == need:
+            if pos - events[left][0] + 1 <= need + slop:
+                return True
+            lterm = events[left][1]
+            counts[lterm] -= 1
+            if not counts[lterm]:
+                del counts[lterm]
+            left += 1
+    return False
+
+
+def _snippet(tokens: List[str], matched: List[int], size: int = SNIPPET_TOKENS) -> Tuple[str, List[List[int]]]:
+    """
+    Window of `size` tokens with the most matched positions, plus the character
+    ranges [start, end) of the matched tokens inside the snippet.
+    """
+    if len(tokens) <= size or not matched:
+        start = 0
+    else:
+        best, best_count, j = matched[0], 0, 0
+        for i, p in enumerate(matched):
+            while matched[j] < p - size + 1:
+                j += 1
+            if i - j + 1 > best_count:
+                best, best_count = max(0, p - size + 1), i - j + 1
+        # center the matches in the window
+        span_end = max(q for q in matched if best <= q < best + size)
+        span_start = min(q for q in matched if best <= q < best + size)
+        start = max(0, min(len(tokens) - size, (span_start + span_end) // 2 - size // 2))
+    end = min(len(tokens), start + size)
+
+    hits = set(matched)
+    text_parts: List[str] = []
+    ranges: List[List[int]] = []
+    offset = 0
+    for pos in range(start, end):
+        if text_parts:
+            offset += 1
+        tok = tokens[pos]
+        if pos in hits:
+            if ranges and ranges[-1][1] == offset - 1 and pos - 1 in hits:
+                ranges[-1][1] = offset + len(tok)
+            else:
+                ranges.append([offset, offset + len(tok)])
+        text_parts.append(tok)
+        offset += len(tok)
+    return " ".join(text_parts), ranges
+
+
+class TenantIndex:
+    def __init__(self):
+        self.records: List[Optional[Dict[str, Any]]] = []
+        self.doc_len: List[int] = []
+        self.doc_terms: List[Optional[Dict[str, int]]] = []
+        self.postings: Dict[str, Dict[int, Tuple[int, bytes]]] = {}
+        # document_id -> {original_filename, created_at, updated_at, slots}
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.n_live = 0
+        self.total_len = 0
+        # (document count, checksum) of the tenant's documents this index reflects
+        self.version: Optional[Tuple[int, int]] = None
+        self._norms: Dict[int, float] = {}
+        self.lock = threading.RLock()
+
+    # the lock can't be pickled (indexes are built in the cpu process pool)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "TenantIndex":
+        """
+        Build from rows of rag.build_chunks_query (ordered by document_id, chunk_index).
+        """
+        index = cls()
+        for document_id, doc_rows in group_rows_by_document(rows).items():
+            index.add_document(document_id, doc_rows)
+        return index
+
+    # --- updates ---
+
+    def add_document(self, document_id: Any, rows: List[Dict[str, Any]]):
+        """
+        (Re)index all chunks of a document. rows carry chunk + documents columns.
+        When the document is already indexed (a new version), chunks with unchanged
+        text keep their slot and postings; only the others are dropped / tokenized.
+        """
+        document_id = str(document_id)
+        with self.lock:
+            reusable: Dict[str, List[int]] = defaultdict(list)
+            old = self.documents.pop(document_id, None)
+            for slot in old["slots"] if old else ():
+                reusable[self.records[slot]["text"]].append(slot)
+
+            first = rows[0] if rows else {}
+            doc = {
+                "original_filename": first.get("original_filename"),
+                "created_at": first.get("created_at"),
+                "updated_at": first.get("updated_at"),
+                "slots": [],
+            }
+            for row in sorted(rows, key=lambda r: r["chunk_index"]):
+                text = row["text"] or ""
+                meta = row.get("metadata") or {}
+                record = {
+                    "document_id": row["document_id"],
+                    "chunk_index": row["chunk_index"],
+                    "filename": meta.get("filename", str(row["document_id"])),
+                    "page": meta.get("page", "?"),
+                    "text": text,
+                }
+                if reusable.get(text):
+                    slot = reusable[text].pop(0)
+                    self.records[slot] = record
+                else:
+                    slot = self._add_slot(record)
+                doc["slots"].append(slot)
+            for slots in reusable.values():
+                for slot in slots:
+                    self._drop_slot(slot)
+            self.documents[document_id] = doc
+            self._norms.clear()  # N / df changed
+
+    def remove_document(self, document_id: Any):
+        document_id = str(document_id)
+        with self.lock:
+            doc = self.documents.pop(document_id, None)
+            if doc is None:
+                return
+            for slot in doc["slots"]:
+                self._drop_slot(slot)
+            self._norms.clear()
+
+    def _add_slot(self, record: Dict[str, Any]) -> int:
+        slot = len(self.records)
+        tokens = simple_normalize(record["text"])
+        positions: Dict[str, List[int]] = defaultdict(list)
+        for pos, tok in enumerate(tokens):
+            positions[tok].append(pos)
+        for term, ps in positions.items():
+            self.postings.setdefault(term, {})[slot] = (len(ps), encode_positions(ps))
+        self.records.append(record)
+        self.doc_len.append(len(tokens))
+        self.doc_terms.append({term: len(ps) for term, ps in positions.items()})
+        self.n_live += 1
+        self.total_len += len(tokens)
+        return slot
+
+    def _drop_slot(self, slot: int):
+        for term in self.doc_terms[slot] or ():
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(slot, None)
+                if not plist:
+                    del self.postings[term]
+        self.n_live -= 1
+        self.total_len -= self.doc_len[slot]
+        self.records[slot] = None
+        self.doc_terms[slot] = None
+
+    def compact(self, dead_share: float = COMPACT_DEAD_SHARE) -> bool:
+        """
+        Renumber the live slots densely when more than `dead_share` of all slots
+        are dead (chunks of removed documents and replaced chunk versions).
+        Returns whether it compacted.
+        """
+        with self.lock:
+            dead = len(self.records) - self.n_live
+            if not dead or dead <= dead_share * len(self.records):
+                return False
+            remap: Dict[int, int] = {}
+            records: List[Optional[Dict[str, Any]]] = []
+            doc_len: List[int] = []
+            doc_terms: List[Optional[Dict[str, int]]] = []
+            for slot, record in enumerate(self.records):
+                if record is None:
+                    continue
+                remap[slot] = len(records)
+                records.append(record)
+                doc_len.append(self.doc_len[slot])
+                doc_terms.append(self.doc_terms[slot])
+            self.postings = {t: {remap[s]: e for s, e in plist.items()} for t, plist in self.postings.items()}
+            for doc in self.documents.values():
+                doc["slots"] = [remap[s] for s in doc["slots"]]
+            self.records, self.doc_len, self.doc_terms = records, doc_len, doc_terms
+            self._norms = {remap[s]: n for s, n in self._norms.items()}
+            return True
+
+    # --- search ---
+
+    def _allowed_slots(self, filters) -> Optional[Set[int]]:
+        if filters is None:
+            return None
+        document_ids = {str(d) for d in filters.document_ids} if filters.document_ids is not None else None
+        filenames = set(filters.filenames) if filters.filenames is not None else None
+        pages = [(r.start, r.end if r.end is not None else r.start) for r in filters.pages] if filters.pages is not None else None
+
+        allowed: Set[int] = set()
+        for document_id, doc in self.documents.items():
+            if document_ids is not None and document_id not in document_ids:
+                continue
+            if filenames is not None and doc["original_filename"] not in filenames:
+                continue
+            # uploaded = the current version's updated_at, like rag.CHUNK_FILTER_CONDITIONS
+            if filters.uploaded_after is not None and not _ts_ge(doc["updated_at"], filters.uploaded_after):
+                continue
+            if filters.uploaded_before is not None and _ts_ge(doc["updated_at"], filters.uploaded_before):
+                continue
+            for slot in doc["slots"]:
+                if pages is not None:
+                    page = self.records[slot]["page"]
+                    if not isinstance(page, int) or not any(lo <= page <= hi for lo, hi in pages):
+                        continue
+                allowed.add(slot)
+        return allowed
+
+    def _norm(self, slot: int, cos_idf, cache: Dict[int, float]) -> float:
+        norm = cache.get(slot)
+        if norm is None:
+            length = self.doc_len[slot] or 1
+            norm = math.sqrt(sum(((tf / length) * cos_idf(t)) ** 2 for t, tf in self.doc_terms[slot].items())) or 1.0
+            cache[slot] = norm
+        return norm
+
+    def _stats(self, allowed: Optional[Set[int]]):
+        """
+        (N, total length, df) of the slots a search ranks. With a filter that
+        doesn't cover every chunk, they're computed over the allowed slots only
+        (df lazily, per term).
+        """
+        if allowed is None or len(allowed) == self.n_live:
+            return self.n_live, self.total_len, lambda t: len(self.postings.get(t, ()))
+
+        seen: Dict[str, int] = {}
+
+        def df(t: str) -> int:
+            n = seen.get(t)
+            if n is None:
+                plist = self.postings.get(t, {})
+                if len(allowed) < len(plist):
+                    n = sum(1 for s in allowed if s in plist)
+                else:
+                    n = sum(1 for s in plist if s in allowed)
+                seen[t] = n
+            return n
+
+        return len(allowed), sum(self.doc_len[s] for s in allowed), df
+
+    def search(self, question: str, top_k: int = 5, filters=None, alpha: float = 0.6) -> List[Dict[str, Any]]:
+        """
+        Hybrid BM25 + TF-IDF cosine search; quoted phrases must match.
+        Hits carry the chunk record, score, a focused snippet and highlight ranges.
+        """
+        with self.lock:
+            return self._search(question, top_k, filters, alpha)
+
+    def _search(self, question: str, top_k: int, filters, alpha: float) -> List[Dict[str, Any]]:
+        if top_k <= 0:
+            return []
+        qtoks, phrases = parse_query(question)
+        allowed = self._allowed_slots(filters)
+        N, total_len, df = self._stats(allowed)
+        qterms = [t for t in dict.fromkeys(qtoks) if df(t)]
+        if not qterms:
+            return []
+
+        if phrases:
+            candidates: Optional[Set[int]] = None
+            for words, _ in phrases:
+                for w in words:
+                    slots = set(self.postings.get(w, ()))
+                    candidates = slots if candidates is None else candidates & slots
+            candidates = {
+                s for s in candidates or ()
+                if all(
+                    _phrase_match([decode_positions(self.postings[w][s][1]) for w in words], slop)
+                    for words, slop in phrases
+                )
+            }
+        else:
+            candidates = set()
+            for t in qterms:
+                candidates.update(self.postings[t])
+        if allowed is not None:
+            candidates &= allowed
+        if not candidates:
+            return []
+
+        avgdl = total_len / N if N else 0.0
+        k1, b = 1.5, 0.75
+        bm25_idf = {t: math.log((N - df(t) + 0.5) / (df(t) + 0.5) + 1.0) for t in qterms}
+        # norms of the whole-tenant statistics are cached across searches
+        norms = self._norms if N == self.n_live else {}
+
+        def cos_idf(t: str) -> float:
+            return math.log((N + 1) / (df(t) + 1)) + 1.0
+
+        q_counts = Counter(t for t in qtoks if t in bm25_idf)
+        q_len = len(qtoks) or 1
+        q_vec = {t: (c / q_len) * cos_idf(t) for t, c in q_counts.items()}
+        q_norm = math.sqrt(sum(v * v for v in q_vec.values())) or 1.0
+
+        scored: List[Tuple[float, int]] = []
+        for slot in candidates:
+            dl = self.doc_len[slot] or 1
+            bm25 = 0.0
+            dot = 0.0
+            for t in qterms:
+                entry = self.postings[t].get(slot)
+                if entry is None:
+                    continue
+                tf = entry[0]
+                bm25 += bm25_idf[t] * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * dl / (avgdl or 1)))
+                dot += q_vec[t] * (tf / dl) * cos_idf(t)
+            cos = dot / (q_norm * self._norm(slot, cos_idf, norms))
+            scored.append((alpha * cos + (1 - alpha) * bm25, slot))
+
+        out: List[Dict[str, Any]] = []
+        for score, slot in heapq.nlargest(top_k, scored):
+            rec = dict(self.records[slot])
+            rec["score"] = float(score)
+            matched = sorted(
+                p for t in qterms if slot in self.postings[t] for p in decode_positions(self.postings[t][slot][1])
+            )
+            # chunk texts are already normalized, space-joined tokens
+            rec["snippet"], rec["highlights"] = _snippet(rec["text"].split(), matched)
+            out.append(rec)
+        return out
+
+
+def _ts_ge(a, b) -> bool:
+    # both sides are aware: updated_at is TIMESTAMPTZ, QueryFilters normalises naive values to UTC
+    return a is not None and a >= b
+
+
+def group_rows_by_document(rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault(str(row["document_id"]), []).append(row)
+    return grouped
+
+
+def build_index(rows: List[Dict[str, Any]]) -> TenantIndex:
+    # top-level so it can run in the cpu process pool
+    return TenantIndex.from_rows(rows)
+
+
+def search_rows(rows: List[Dict[str, Any]], question: str, top_k: int, filters=None) -> List[Dict[str, Any]]:
+    # one-off search over a (filtered) row subset, for tenants without a cached index
+    return TenantIndex.from_rows(rows).search(question, top_k, filters)
+
+
+# --- snapshots ---
+# Pickled TenantIndex per tenant, written by this app only (never load foreign files).
+# The stored version lets the loader catch up incrementally with IndexCache._sync.
+
+def save_snapshot(index: TenantIndex, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with index.lock:
+        index.compact()
+        with open(tmp, "wb") as f:
+            pickle.dump((SNAPSHOT_FORMAT, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)  # atomic: readers (other workers) never see half a file
+
+
+def load_snapshot(path: str) -> Optional[TenantIndex]:
+    """
+    The snapshot at `path`, or None if it is missing, unreadable or of an older format.
+    """
+    try:
+        with open(path, "rb") as f:
+            fmt, index = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("ignoring unreadable index snapshot %s", path, exc_info=True)
+        return None
+    return index if fmt == SNAPSHOT_FORMAT and isinstance(index, TenantIndex) else None
@@ -1,11 +1,13 @@
 # backend/app/services/ingestion.py
 
+import hashlib
+from collections import defaultdict, deque
 from uuid import UUID
-from typing import List
-from psycopg2.extensions import connection as PGConnection
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from psycopg import AsyncConnection
 import os
-from .chunking import read_pdf_text_by_page, chunk_text
-from psycopg2.extras import Json
+from .chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP, read_pdf_text_by_page, chunk_text
+from psycopg.types.json import Jsonb
 
 EMBEDDING_DIM = 768  # still needed for the embedding column; dummy for now
 
@@ -19,61 +21,211 @@ def dummy_embedding(text: str) -> list[float]:
     return [0.0] * EMBEDDING_DIM
 
 
-def ingest_document(
-    conn: PGConnection,
-    tenant_id: UUID,
-    document_id: UUID,
-    file_path: str,
-):
+def content_hash(text: str) -> str:
+    # same as md5(text) in Postgres, so rows stored before the column existed can be compared
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def extract_chunks(file_path: str, filename: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Ingest a single document:
+    CPU-bound part of ingestion (no DB access), run in the parse_executor process pool:
     - read PDF by page
     - chunk each page using token-based chunking
-    - insert chunks into DB with dummy embeddings and metadata (filename, page)
-    - set documents.status = 'ready'
+    Returns a list of {chunk_index, text, content_hash, metadata} in document order.
+    metadata.filename is `filename` (default: the file's name).
     """
-    filename = os.path.basename(file_path)
-
-    # 1. Read pages
+    filename = filename or os.path.basename(file_path)
     pages = read_pdf_text_by_page(file_path)
 
-    # 2. Build chunks with metadata
-    with conn.cursor() as cur:
-        chunk_counter = 0
-        for page_idx, page_text in enumerate(pages, start=1):
-            if not page_text or not page_text.strip():
-                continue
-            chunks = chunk_text(page_text, max_tokens=220, overlap=40)
-            for chunk_text_str in chunks:
-                emb = dummy_embedding(chunk_text_str)
-                metadata = {
-                    "filename": filename,
-                    "page": page_idx,
+    out: List[Dict[str, Any]] = []
+    for page_idx, page_text in enumerate(pages, start=1):
+        if not page_text or not page_text.strip():
+            continue
+        for chunk_text_str in chunk_text(page_text, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP):
+            out.append(
+                {
+                    "chunk_index": len(out),
+                    "text": chunk_text_str,
+                    "content_hash": content_hash(chunk_text_str),
+                    "metadata": {
+                        "filename": filename,
+                        "page": page_idx,
+                    },
                 }
-                cur.execute(
-                    """
-                    INSERT INTO chunks (tenant_id, document_id, chunk_index, text, embedding, metadata)
-                    VALUES (%s, %s, %s, %s, %s::vector, %s)
-                    """,
-                    (
-                        str(tenant_id),
-                        str(document_id),
-                        chunk_counter,
-                        chunk_text_str,
-                        emb,
-                        Json(metadata),
-                    ),
-                )
-                chunk_counter += 1
-
-        # 3. Update document status
-        cur.execute(
+            )
+    return out
+
+
+async def _insert_chunks(cur, tenant_id: UUID, document_id: UUID, chunks: List[Dict[str, Any]]):
+    await cur.executemany(
+        """
+        INSERT INTO chunks (tenant_id, document_id, chunk_index, text, content_hash, embedding, metadata)
+        VALUES (%s, %s, %s, %s, %s, %s::vector, %s)
+        """,
+        [
+            (
+                str(tenant_id),
+                str(document_id),
+                c["chunk_index"],
+                c["text"],
+                c["content_hash"],
+                dummy_embedding(c["text"]),
+                Jsonb(c["metadata"]),
+            )
+            for c in chunks
+        ],
+    )
+
+
+async def ingest_document(
+    conn: AsyncConnection,
+    tenant_id: UUID,
+    document_id: UUID,
+    chunks: List[Dict[str, Any]],
+):
+    """
+    Store the chunks produced by extract_chunks for a document:
+    - insert chunks into DB with dummy embeddings and metadata (filename, page)
+    - set documents.status = 'ready' (updated_at tells the search indexes to pick it up)
+    """
+    async with conn.cursor() as cur:
+        await _insert_chunks(cur, tenant_id, document_id, chunks)
+
+        # Update document status
+        await cur.execute(
             """
             UPDATE documents
-            SET status = 'ready'
+            SET status = 'ready', updated_at = NOW()
+            WHERE id = %s
+            """,
+            (str(document_id),),
+        )
+
+    await conn.commit()
+
+
+# --- new versions of an existing document ---
+
+async def find_ready_document(conn: AsyncConnection, tenant_id: UUID, original_filename: str) -> dict | None:
+    """
+    The tenant's current ready document with this filename (the key for new versions).
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT id, version
+            FROM documents
+            WHERE tenant_id = %s AND original_filename = %s AND status = 'ready'
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (str(tenant_id), original_filename),
+        )
+        return await cur.fetchone()
+
+
+def diff_chunks(
+    stored: List[Dict[str, Any]],
+    chunks: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Tuple[str, int, Dict[str, Any]]], List[str]]:
+    """
+    Match the chunks of a new version against the stored ones by content hash, in order.
+    Returns
+    - inserts: new chunks without a stored twin
+    - updates: (id, chunk_index, metadata) of stored chunks kept at another position / page
+    - deletes: ids of stored chunks that are not in the new version
+    """
+    by_hash: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+    for row in sorted(stored, key=lambda r: r["chunk_index"]):
+        by_hash[row["content_hash"]].append(row)
+
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Tuple[str, int, Dict[str, Any]]] = []
+    for c in chunks:
+        twins = by_hash.get(c["content_hash"])
+        if not twins:
+            inserts.append(c)
+            continue
+        row = twins.popleft()
+        if row["chunk_index"] != c["chunk_index"] or (row["metadata"] or {}) != c["metadata"]:
+            updates.append((str(row["id"]), c["chunk_index"], c["metadata"]))
+    deletes = [str(row["id"]) for twins in by_hash.values() for row in twins]
+    return inserts, updates, deletes
+
+
+async def reingest_document(
+    conn: AsyncConnection,
+    tenant_id: UUID,
+    document_id: UUID,
+    chunks: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Replace a ready document's chunks with those of a new version, touching only what changed:
+    - unchanged chunks (same content hash) stay, with chunk_index / page updated if they moved
+    - new chunks are inserted, chunks missing from the new version are deleted
+    - documents.version is bumped (and updated_at, so the search indexes re-sync the document)
+    The document row is locked for the diff, so concurrent versions apply one after the other.
+    Returns the new version and the number of inserted / updated / deleted / kept chunks.
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT version
+            FROM documents
             WHERE id = %s
+            FOR UPDATE
+            """,
+            (str(document_id),),
+        )
+        version = (await cur.fetchone())["version"]
+        await cur.execute(
+            """
+            SELECT id, chunk_index, coalesce(content_hash, md5(text)) AS content_hash, metadata
+            FROM chunks
+            WHERE document_id = %s
             """,
             (str(document_id),),
         )
+        stored = await cur.fetchall()
+
+        inserts, updates, deletes = diff_chunks(stored, chunks)
+        changed = bool(inserts or updates or deletes)
+        if deletes:
+            await cur.execute(
+                """
+                DELETE FROM chunks
+                WHERE id = ANY(%s::uuid[])
+                """,
+                (deletes,),
+            )
+        if updates:
+            # content_hash too: rows from before the column existed get theirs here
+            await cur.executemany(
+                """
+                UPDATE chunks
+                SET chunk_index = %s, metadata = %s, content_hash = coalesce(content_hash, md5(text))
+                WHERE id = %s
+                """,
+                [(chunk_index, Jsonb(metadata), chunk_id) for chunk_id, chunk_index, metadata in updates],
+            )
+        if inserts:
+            await _insert_chunks(cur, tenant_id, document_id, inserts)
+        if changed:
+            version += 1
+            await cur.execute(
+                """
+                UPDATE documents
+                SET version = %s, updated_at = NOW()
+                WHERE id = %s
+                """,
+                (version, str(document_id)),
+            )
 
-    conn.commit()
+    await conn.commit()
+    return {
+        "version": version,
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "kept": len(chunks) - len(inserts),
+    }
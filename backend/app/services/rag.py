@@ -1,91 +1,379 @@
 # backend/app/services/rag.py
 
-from typing import List, Dict, Any
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Any, Optional, Set, Tuple
 from uuid import UUID
-from psycopg2.extensions import connection as PGConnection
+from psycopg import AsyncConnection
 
-from .chunking import (
-    simple_normalize,
-    rewrite_query,
-    hybrid_search,
-    build_prompt as build_prompt_from_chunks,
-)
+from .. import db
+from ..config import settings
+from ..schemas import QueryFilters
+from .executors import cpu_executor, search_executor
+from .chunking import build_prompt as build_prompt_from_chunks
+from .index import TenantIndex, build_index, group_rows_by_document, load_snapshot, save_snapshot, search_rows
+
+logger = logging.getLogger(__name__)
+
+
+# Filter predicates pushed into the chunk query, as SQL conditions against
+# chunks c / documents d. Covered by the indexes created in init_db.py.
+# "pages" is one range; several ranges are OR'ed, so each one is a range scan
+# on idx_chunks_tenant_page.
+CHUNK_FILTER_CONDITIONS: Dict[str, str] = {
+    "document_ids": "c.document_id = ANY(%s::uuid[])",
+    "filenames": "d.original_filename = ANY(%s::text[])",
+    "pages": "(c.metadata->>'page')::int BETWEEN %s AND %s",
+    # "uploaded" is when the current version was uploaded: updated_at, which re-ingesting moves
+    "uploaded_after": "d.updated_at >= %s",
+    "uploaded_before": "d.updated_at < %s",
+}
 
+# document columns come along so the positional index can filter without the DB
+CHUNKS_SELECT = """
+    SELECT c.document_id, c.chunk_index, c.text, c.metadata,
+           d.original_filename, d.created_at, d.updated_at
+    FROM chunks c
+    JOIN documents d ON d.id = c.document_id
+"""
+CHUNKS_ORDER_BY = "ORDER BY c.document_id, c.chunk_index"
 
-def build_corpus_from_db_rows(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+def build_chunks_query(tenant_id: UUID, filters: Optional[QueryFilters] = None) -> Tuple[str, List[Any]]:
     """
-    Build a corpus dict from DB rows in chunks:
-    - records: list of {idx, document_id, chunk_index, filename, page, text}
-    - doc_tokens: list of token lists for each record
+    SQL + params selecting a tenant's chunks of ready documents, restricted by the given filters.
     """
-    records: List[Dict[str, Any]] = []
-    doc_tokens: List[List[str]] = []
+    conditions = ["c.tenant_id = %s", "d.status = 'ready'"]
+    params: List[Any] = [str(tenant_id)]
 
-    for idx, row in enumerate(rows):
-        text = row["text"] or ""
-        tokens = simple_normalize(text)
-        meta = row.get("metadata") or {}
-        filename = meta.get("filename", str(row["document_id"]))
-        page = meta.get("page", "?")
+    def add(name: str, *values: Any):
+        conditions.append(CHUNK_FILTER_CONDITIONS[name])
+        params.extend(values)
 
-        records.append(
-            {
-                "idx": idx,
-                "document_id": row["document_id"],
-                "chunk_index": row["chunk_index"],
-                "filename": filename,
-                "page": page,
-                "text": text,
-            }
-        )
-        doc_tokens.append(tokens)
+    if filters is not None:
+        if filters.document_ids is not None:
+            add("document_ids", [str(d) for d in filters.document_ids])
+        if filters.filenames is not None:
+            add("filenames", list(filters.filenames))
+        if filters.pages is not None:
+            # an empty list matches no page: the range 1..0 is empty
+            ranges = [(r.start, r.end if r.end is not None else r.start) for r in filters.pages] or [(1, 0)]
+            conditions.append("(" + " OR ".join([CHUNK_FILTER_CONDITIONS["pages"]] * len(ranges)) + ")")
+            for lo, hi in ranges:
+                params.extend((lo, hi))
+        if filters.uploaded_after is not None:
+            add("uploaded_after", filters.uploaded_after)
+        if filters.uploaded_before is not None:
+            add("uploaded_before", filters.uploaded_before)
 
-    return {"records": records, "doc_tokens": doc_tokens}
+    sql = CHUNKS_SELECT + "WHERE " + "\n  AND ".join(conditions) + "\n" + CHUNKS_ORDER_BY
+    return sql, params
 
 
-def retrieve_relevant_chunks_lexical(
-    conn: PGConnection,
+async def fetch_tenant_chunks(
+    conn: AsyncConnection,
     tenant_id: UUID,
-    question: str,
-    top_k: int = 5,
+    filters: Optional[QueryFilters] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Lexical retrieval using BM25 + TF-IDF hybrid for all chunks of a tenant.
+    Load the chunk rows of a tenant, optionally only those matching `filters`.
     """
-    with conn.cursor() as cur:
-        cur.execute(
+    sql, params = build_chunks_query(tenant_id, filters)
+    async with conn.cursor() as cur:
+        await cur.execute(sql, params)
+        return await cur.fetchall()
+
+
+async def fetch_index_version(conn: AsyncConnection, tenant_id: UUID) -> Tuple[int, int]:
+    """
+    (number, checksum) of the tenant's ready documents; changes whenever a
+    document is added, removed or re-ingested (updated_at moves).
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
             """
-            SELECT document_id, chunk_index, text, metadata
-            FROM chunks
-            WHERE tenant_id = %s
+            SELECT count(*) AS n, coalesce(sum(hashtext(id::text || updated_at::text)), 0) AS checksum
+            FROM documents
+            WHERE tenant_id = %s AND status = 'ready'
             """,
             (str(tenant_id),),
         )
-        rows = cur.fetchall()
+        row = await cur.fetchone()
+        return int(row["n"]), int(row["checksum"])
 
+
+async def fetch_ready_documents(conn: AsyncConnection, tenant_id: UUID) -> List[Dict[str, Any]]:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT id, updated_at
+            FROM documents
+            WHERE tenant_id = %s AND status = 'ready'
+            """,
+            (str(tenant_id),),
+        )
+        return await cur.fetchall()
+
+
+def rank_chunks(rows: List[Dict[str, Any]], question: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    CPU-bound scoring of chunk rows against the question (no DB access), for
+    tenants without a cached index. Builds a throwaway positional index over
+    the rows. Runs in the cpu_executor process pool, so it must stay a
+    picklable top-level function.
+    """
     if not rows:
         return []
+    return search_rows(rows, question, top_k)
+
+
+class IndexCache:
+    """
+    Per-worker LRU of TenantIndex objects.
+
+    - a miss loads the tenant's snapshot from snapshot_dir if there is one, else all
+      chunks of the tenant, and builds the index in the cpu process pool
+      (concurrent misses for the same tenant share one load)
+    - at most every sync_interval seconds a hit compares the index against the
+      tenant's document version and re-indexes only added / changed / removed documents,
+      so uploads through other workers show up without a full rebuild; a loaded
+      snapshot catches up the same way; if that check fails (DB down, pool exhausted)
+      the cached index keeps being served and the check is retried after sync_interval
+    - save_dirty() writes snapshots of indexes that changed since they were loaded
+    """
+
+    def __init__(self, max_tenants: int, sync_interval: float, snapshot_dir: str = ""):
+        self.max_tenants = max_tenants
+        self.sync_interval = sync_interval
+        self.snapshot_dir = snapshot_dir
+        self._indexes: "OrderedDict[str, TenantIndex]" = OrderedDict()
+        self._checked_at: Dict[str, float] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._dirty: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.miss_wait_seconds = 0.0
+        self.miss_wait_max = 0.0
+        self.loads = 0
+        self.snapshot_loads = 0
+        self.snapshots_saved = 0
+        self.syncs = 0
+        self.sync_errors = 0
+        self.evictions = 0
+
+    def cached(self, tenant_id: UUID | str) -> bool:
+        return str(tenant_id) in self._indexes
+
+    def mark_stale(self, tenant_id: UUID | str):
+        # next get() re-checks the version (e.g. right after an upload in this worker)
+        self._checked_at.pop(str(tenant_id), None)
 
-    corpus = build_corpus_from_db_rows(rows)
-    qobj = rewrite_query(question)
-    hits = hybrid_search(qobj, corpus, top_k=top_k)
-    return hits
+    async def get(self, tenant_id: UUID | str) -> TenantIndex:
+        key = str(tenant_id)
+        task = self._pending.get(key)
+        index = self._indexes.get(key)
+        if task is None:
+            if index is not None and time.monotonic() - self._checked_at.get(key, 0.0) < self.sync_interval:
+                self.hits += 1
+                self._indexes.move_to_end(key)
+                return index
+            # own task: a cancelled request must not abort a load others are waiting for
+            task = asyncio.create_task(self._refresh(key, index))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        if index is not None:
+            return await asyncio.shield(task)
+        # time spent waiting for an index that isn't in memory (e.g. first query after a restart)
+        started = time.monotonic()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waited = time.monotonic() - started
+            self.misses += 1
+            self.miss_wait_seconds += waited
+            self.miss_wait_max = max(self.miss_wait_max, waited)
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._pending.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved by the waiters; don't log it as unhandled
+
+    async def _refresh(self, key: str, index: Optional[TenantIndex]) -> TenantIndex:
+        index = await (self._sync(key, index) if index is not None else self._load(key))
+        self._store(key, index)
+        return index
+
+    def _store(self, key: str, index: TenantIndex):
+        self._indexes[key] = index
+        self._indexes.move_to_end(key)
+        self._checked_at[key] = time.monotonic()
+        while len(self._indexes) > self.max_tenants:
+            old, _ = self._indexes.popitem(last=False)
+            self._checked_at.pop(old, None)
+            self.evictions += 1
+
+    def _snapshot_path(self, key: str) -> Optional[str]:
+        return os.path.join(self.snapshot_dir, f"{key}.idx") if self.snapshot_dir else None
+
+    def snapshot_tenants(self) -> List[str]:
+        """
+        Tenants with a snapshot on disk, most recently written first.
+        """
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return []
+        entries = [e for e in os.scandir(self.snapshot_dir) if e.name.endswith(".idx")]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        return [e.name[: -len(".idx")] for e in entries]
+
+    async def _load(self, key: str) -> TenantIndex:
+        path = self._snapshot_path(key)
+        if path and os.path.exists(path):
+            index = await search_executor.run(load_snapshot, path)
+            if index is not None:
+                self.snapshot_loads += 1
+                return await self._sync(key, index)
+
+        async with db.connection() as conn:
+            version = await fetch_index_version(conn, key)
+            rows = await fetch_tenant_chunks(conn, key)
+        index = await cpu_executor.run(build_index, rows)
+        index.version = version
+        self.loads += 1
+        self._dirty.add(key)
+        return index
+
+    async def _sync(self, key: str, index: TenantIndex) -> TenantIndex:
+        try:
+            async with db.connection() as conn:
+                version = await fetch_index_version(conn, key)
+                if version == index.version:
+                    return index
+                current = {str(r["id"]): r["updated_at"] for r in await fetch_ready_documents(conn, key)}
+                removed = [d for d in index.documents if d not in current]
+                changed = [d for d, ts in current.items() if index.documents.get(d, {}).get("updated_at") != ts]
+                rows = await fetch_tenant_chunks(conn, key, QueryFilters(document_ids=changed)) if changed else []
+        except Exception:
+            # a slightly stale index beats a failed query; _store() rate-limits the retry
+            self.sync_errors += 1
+            logger.exception("index version check for tenant %s failed, serving the cached index", key)
+            return index
+        await search_executor.run(_apply_changes, index, removed, changed, rows)
+        index.version = version
+        self.syncs += 1
+        self._dirty.add(key)
+        return index
+
+    async def save_dirty(self):
+        """
+        Write snapshots of the cached indexes that changed since they were loaded.
+        """
+        for key in list(self._dirty):
+            index = self._indexes.get(key)
+            path = self._snapshot_path(key)
+            self._dirty.discard(key)
+            if index is None or path is None:
+                continue
+            try:
+                await search_executor.run(save_snapshot, index, path)
+                self.snapshots_saved += 1
+            except Exception:
+                logger.exception("writing index snapshot for tenant %s failed", key)
+
+    def clear(self):
+        # drop everything, counters included (lifespan shutdown)
+        self.__init__(self.max_tenants, self.sync_interval, self.snapshot_dir)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenants": len(self._indexes),
+            "max_tenants": self.max_tenants,
+            "chunks": sum(i.n_live for i in self._indexes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "miss_wait_avg_ms": round(1000 * self.miss_wait_seconds / self.misses, 2) if self.misses else 0.0,
+            "miss_wait_max_ms": round(1000 * self.miss_wait_max, 2),
+            "loads": self.loads,
+            "snapshot_loads": self.snapshot_loads,
+            "snapshots_saved": self.snapshots_saved,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "evictions": self.evictions,
+        }
+
+
+def _apply_changes(index: TenantIndex, removed: List[str], changed: List[str], rows: List[Dict[str, Any]]):
+    grouped = group_rows_by_document(rows)
+    with index.lock:
+        for document_id in removed:
+            index.remove_document(document_id)
+        for document_id in changed:
+            if document_id in grouped:
+                index.add_document(document_id, grouped[document_id])
+            else:
+                index.remove_document(document_id)
+        index.compact()
+
+
+index_cache = IndexCache(
+    max_tenants=settings.INDEX_CACHE_MAX_TENANTS,
+    sync_interval=settings.INDEX_SYNC_INTERVAL_SECONDS,
+    snapshot_dir=settings.INDEX_SNAPSHOT_DIR,
+)
+
+
+async def retrieve_relevant_chunks_lexical(
+    tenant_id: UUID,
+    question: str,
+    top_k: int = 5,
+    filters: Optional[QueryFilters] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Lexical retrieval (BM25 + TF-IDF hybrid, quoted phrases) over the tenant's positional index.
+    A filtered query on a tenant that is not cached yet loads and scores only
+    the matching subset (filters pushed into SQL) instead of waiting for the full index.
+    Either way a filtered query is scored with the statistics of the matching subset,
+    so results don't depend on whether the index is cached.
+    """
+    if filters is not None and not index_cache.cached(tenant_id):
+        async with db.connection() as conn:
+            rows = await fetch_tenant_chunks(conn, tenant_id, filters)
+        return await cpu_executor.run(rank_chunks, rows, question, top_k)
+
+    index = await index_cache.get(tenant_id)
+    return await search_executor.run(index.search, question, top_k, filters)
 
 
 def build_rag_prompt(question: str, hits: List[Dict[str, Any]]) -> str:
     """
     Build the full prompt from question and hits, using your existing logic.
     """
-    return build_prompt_from_chunks(question, hits)
+    return build_prompt_from_chunks(question, hits, token_budget=settings.PROMPT_CONTEXT_TOKEN_BUDGET)
 
 
-def call_llm(prompt: str) -> str:
+async def stream_llm(prompt: str) -> AsyncIterator[str]:
     """
-    Dummy LLM call.
-    Later: replace with real Vertex AI call.
+    Stream the LLM answer as text deltas.
+    Local stand-in for now: emits the dummy answer word by word,
+    waiting LLM_STUB_TOKEN_DELAY_MS between tokens like a provider would.
+    Later: replace with a streaming Vertex AI call.
     """
-    return (
+    answer = (
         "DUMMY_ANSWER: (Hier würde die LLM-Antwort stehen.)\n\n"
         "Prompt, das an das LLM geschickt worden wäre:\n\n"
         + prompt
     )
+    delay = settings.LLM_STUB_TOKEN_DELAY_MS / 1000.0
+    for token in re.findall(r"\S+\s*|\s+", answer):
+        await asyncio.sleep(delay)
+        yield token
+
+
+async def call_llm(prompt: str) -> str:
+    """
+    Non-streaming LLM call: collects the full answer from stream_llm.
+    """
+    return "".join([token async for token in stream_llm(prompt)])
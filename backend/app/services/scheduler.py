@@ -0,0 +1,249 @@
+# backend/app/services/scheduler.py
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Tuple
+from uuid import UUID
+
+from ..config import settings
+
+# Per-tenant admission control and fair scheduling.
+#
+# Every retrieval / ingestion job asks its scheduler for a slot first:
+# - token bucket per tenant (rate + burst): over the rate -> 429 right away
+# - at most `slots` jobs run at once, at most `per_tenant` of them per tenant
+# - waiting jobs are dispatched by weighted fair queueing (smallest virtual
+#   finish tag first), so a tenant with a long queue cannot starve the others
+# - per-tenant queues are bounded: a full queue -> 429 with a retry hint
+#   (checked before the rate, so a rejected request doesn't use up a token)
+# - idle tenants (nothing running or queued, token bucket full again) are
+#   forgotten, so the state and /metrics only cover recently active tenants
+
+
+class TenantThrottled(Exception):
+    """
+    Raised when a tenant is over its rate or queue limit.
+    Mapped to 429 + Retry-After in main.py.
+    """
+
+    def __init__(self, name: str, reason: str, retry_after: int):
+        super().__init__(f"{name}: {reason}")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _TenantState:
+    def __init__(self, weight: float, burst: float):
+        self.weight = weight
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.finish_tag = 0.0
+        self.running = 0
+        self.queue: Deque[Tuple[float, asyncio.Future]] = deque()
+        self.admitted = 0
+        self.rejected_rate = 0
+        self.rejected_queue = 0
+        self.wait_seconds = 0.0
+
+
+class FairScheduler:
+    # seconds between sweeps for idle tenants
+    sweep_interval = 1.0
+
+    def __init__(
+        self,
+        name: str,
+        slots: int,
+        per_tenant: int,
+        rate: float,
+        burst: float,
+        max_queue: int,
+        weights: Dict[str, float] | None = None,
+    ):
+        self.name = name
+        self.slots = slots
+        self.per_tenant = per_tenant
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_queue = max_queue
+        self.weights = weights or {}
+        self.running = 0
+        self.vtime = 0.0
+        self.service_time = 0.1  # EWMA of seconds per job, for retry hints
+        self.tenants: Dict[str, _TenantState] = {}
+        self.evicted = 0
+        self._swept_at = time.monotonic()
+
+    def _state(self, tenant_id: str) -> _TenantState:
+        st = self.tenants.get(tenant_id)
+        if st is None:
+            st = _TenantState(self.weights.get(tenant_id, 1.0), self.burst)
+            self.tenants[tenant_id] = st
+        return st
+
+    def _evict_idle(self):
+        """
+        Drop tenants that have nothing running or queued and a full token bucket:
+        a new state for them behaves the same, except that WFQ no longer remembers
+        their past finish tag (idle tenants neither keep credit nor debt).
+        """
+        now = time.monotonic()
+        if now - self._swept_at < self.sweep_interval:
+            return
+        self._swept_at = now
+        for tenant_id, st in list(self.tenants.items()):
+            if st.running or st.queue:
+                continue
+            if self.rate > 0 and st.tokens + (now - st.refilled_at) * self.rate < self.burst:
+                continue
+            del self.tenants[tenant_id]
+            self.evicted += 1
+
+    def _take_token(self, st: _TenantState) -> float:
+        """
+        Consume one token; returns 0 on success, else seconds until a token is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        st.tokens = min(self.burst, st.tokens + (now - st.refilled_at) * self.rate)
+        st.refilled_at = now
+        if st.tokens >= 1.0:
+            st.tokens -= 1.0
+            return 0.0
+        return (1.0 - st.tokens) / self.rate
+
+    def _dispatch(self):
+        while self.running < self.slots:
+            best: _TenantState | None = None
+            for st in self.tenants.values():
+                if st.queue and st.running < self.per_tenant and (best is None or st.queue[0][0] < best.queue[0][0]):
+                    best = st
+            if best is None:
+                return
+            tag, fut = best.queue.popleft()
+            if fut.cancelled():
+                continue
+            self.vtime = tag
+            best.running += 1
+            self.running += 1
+            fut.set_result(None)
+
+    async def acquire(self, tenant_id: UUID | str) -> _TenantState:
+        self._evict_idle()
+        st = self._state(str(tenant_id))
+
+        # _dispatch runs on every release, so a free slot means nobody eligible is waiting
+        immediate = self.running < self.slots and st.running < self.per_tenant and not st.queue
+        if not immediate and len(st.queue) >= self.max_queue:
+            st.rejected_queue += 1
+            estimate = self.service_time * (len(st.queue) + 1) / max(1, self.per_tenant)
+            raise TenantThrottled(self.name, "too many queued requests", retry_after=max(1, math.ceil(estimate)))
+
+        wait = self._take_token(st)
+        if wait > 0:
+            st.rejected_rate += 1
+            raise TenantThrottled(self.name, "rate limit exceeded", retry_after=max(1, math.ceil(wait)))
+
+        tag = max(self.vtime, st.finish_tag) + 1.0 / st.weight
+        if immediate:
+            st.finish_tag = tag
+            st.admitted += 1
+            st.running += 1
+            self.running += 1
+            return st
+
+        st.finish_tag = tag
+        st.admitted += 1
+        fut = asyncio.get_running_loop().create_future()
+        st.queue.append((tag, fut))
+        started = time.monotonic()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was granted just before the cancellation
+                self._release(st)
+            else:
+                try:
+                    st.queue.remove((tag, fut))
+                except ValueError:
+                    pass
+            raise
+        st.wait_seconds += time.monotonic() - started
+        return st
+
+    def _release(self, st: _TenantState):
+        st.running -= 1
+        self.running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: UUID | str) -> AsyncIterator[None]:
+        st = await self.acquire(tenant_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time = 0.9 * self.service_time + 0.1 * (time.monotonic() - started)
+            self._release(st)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "running": self.running,
+            "queued": sum(len(st.queue) for st in self.tenants.values()),
+            "tenants_evicted": self.evicted,
+            "tenants": {
+                tenant_id: {
+                    "running": st.running,
+                    "queued": len(st.queue),
+                    "admitted": st.admitted,
+                    "rejected_rate": st.rejected_rate,
+                    "rejected_queue": st.rejected_queue,
+                    "avg_wait_ms": round(1000 * st.wait_seconds / st.admitted, 2) if st.admitted else 0.0,
+                }
+                for tenant_id, st in self.tenants.items()
+            },
+        }
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    # "tenant_uuid:weight,tenant_uuid:weight"
+    weights: Dict[str, float] = {}
+    for part in raw.split(","):
+        if ":" in part:
+            tenant_id, weight = part.rsplit(":", 1)
+            weights[tenant_id.strip()] = float(weight)
+    return weights
+
+
+_weights = _parse_weights(settings.TENANT_WEIGHTS)
+
+query_scheduler = FairScheduler(
+    "query",
+    slots=settings.QUERY_SLOTS,
+    per_tenant=settings.QUERY_CONCURRENCY_PER_TENANT,
+    rate=settings.QUERY_RATE_PER_TENANT,
+    burst=settings.QUERY_BURST_PER_TENANT,
+    max_queue=settings.QUERY_MAX_QUEUE_PER_TENANT,
+    weights=_weights,
+)
+
+ingest_scheduler = FairScheduler(
+    "ingest",
+    slots=settings.INGEST_SLOTS,
+    per_tenant=settings.INGEST_CONCURRENCY_PER_TENANT,
+    rate=settings.INGEST_RATE_PER_TENANT,
+    burst=settings.INGEST_BURST_PER_TENANT,
+    max_queue=settings.INGEST_MAX_QUEUE_PER_TENANT,
+    weights=_weights,
+)
+
+
+def stats() -> Dict[str, Any]:
+    return {s.name: s.stats() for s in (query_scheduler, ingest_scheduler)}
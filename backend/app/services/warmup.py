@@ -0,0 +1,151 @@
+# backend/app/services/warmup.py
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List
+
+from ..config import settings
+from .. import db
+from . import rag
+from .executors import cpu_executor, parse_executor
+
+logger = logging.getLogger(__name__)
+
+# Warm start after a deploy / worker restart.
+# The app accepts traffic right away; a background task then
+# - imports the modules that are deferred until first use (passlib, jose)
+#   and starts the cpu and parse worker processes (PyPDF2 is imported there)
+# - loads the search indexes of the most active tenants (snapshot from disk if
+#   there is one, else built from the chunks), one tenant at a time
+# - writes snapshots for the indexes it had to build
+# Queries for a tenant that is still loading share the load instead of starting another.
+
+
+def warm_imports():
+    from jose import jwt  # noqa: F401
+
+    from ..crud import get_pwd_context
+
+    get_pwd_context()
+
+
+def warm_worker():
+    # runs in the cpu / parse process pools
+    import PyPDF2  # noqa: F401
+
+
+async def fetch_active_tenants(days: int, limit: int) -> List[str]:
+    """
+    Tenants ordered by the number of queries in the last `days` days (from audit_logs).
+    """
+    async with db.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT tenant_id, count(*) AS n
+                FROM audit_logs
+                WHERE action = 'query' AND created_at > NOW() - make_interval(days => %s)
+                GROUP BY tenant_id
+                ORDER BY n DESC
+                LIMIT %s
+                """,
+                (days, limit),
+            )
+            return [str(r["tenant_id"]) for r in await cur.fetchall()]
+
+
+class WarmUp:
+    def __init__(self, enabled: bool, activity_days: int):
+        self.enabled = enabled
+        self.activity_days = activity_days
+        self._task: asyncio.Task | None = None
+        self.started_at: float | None = None
+        self.accepting_at: float | None = None
+        self.finished_at: float | None = None
+        self.imports_seconds: float | None = None
+        self.tenants_planned = 0
+        self.tenants_loaded = 0
+        self.tenants_failed = 0
+
+    def begin(self):
+        # called first thing in the lifespan; all timings are relative to it
+        self.started_at = time.monotonic()
+        self.accepting_at = self.finished_at = self.imports_seconds = None
+        self.tenants_planned = self.tenants_loaded = self.tenants_failed = 0
+
+    def start(self):
+        """
+        Mark the app as accepting traffic and start warming in the background.
+        """
+        self.accepting_at = time.monotonic()
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _warm_imports(self):
+        started = time.monotonic()
+        try:
+            # one job per worker, so the pools spawn all of their processes now
+            await asyncio.gather(
+                asyncio.to_thread(warm_imports),
+                *(ex.run(warm_worker) for ex in (cpu_executor, parse_executor) for _ in range(ex.workers)),
+            )
+        except Exception:
+            logger.exception("warm-up: preloading modules failed")
+        self.imports_seconds = time.monotonic() - started
+
+    async def _run(self):
+        imports = asyncio.create_task(self._warm_imports())
+        try:
+            limit = rag.index_cache.max_tenants
+            try:
+                tenants = await fetch_active_tenants(self.activity_days, limit)
+            except Exception:
+                logger.exception("warm-up: could not rank tenants by activity")
+                tenants = []
+            # then tenants with a snapshot but no recent queries
+            for tenant_id in rag.index_cache.snapshot_tenants():
+                if tenant_id not in tenants:
+                    tenants.append(tenant_id)
+            tenants = tenants[:limit]
+            self.tenants_planned = len(tenants)
+
+            for tenant_id in tenants:
+                try:
+                    await rag.index_cache.get(tenant_id)
+                    self.tenants_loaded += 1
+                except Exception:
+                    self.tenants_failed += 1
+                    logger.exception("warm-up: loading the index of tenant %s failed", tenant_id)
+            await rag.index_cache.save_dirty()
+            await imports
+        finally:
+            imports.cancel()
+            self.finished_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        def since_start(t: float | None) -> float | None:
+            return round(t - self.started_at, 3) if t is not None and self.started_at is not None else None
+
+        return {
+            "state": "done" if self.finished_at else ("running" if self._task else "off"),
+            "accepting_after_s": since_start(self.accepting_at),
+            "ready_after_s": since_start(self.finished_at),
+            "imports_s": round(self.imports_seconds, 3) if self.imports_seconds is not None else None,
+            "tenants_planned": self.tenants_planned,
+            "tenants_loaded": self.tenants_loaded,
+            "tenants_failed": self.tenants_failed,
+        }
+
+
+warm_up = WarmUp(enabled=settings.WARMUP_ENABLED, activity_days=settings.WARMUP_ACTIVITY_DAYS)
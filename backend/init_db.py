@@ -33,6 +33,7 @@ CREATE TABLE IF NOT EXISTS documents (
     original_filename TEXT NOT NULL,
     storage_path      TEXT NOT NULL,
     status            TEXT NOT NULL DEFAULT 'uploaded', -- uploaded | processing | ready | error
+    version           INT NOT NULL DEFAULT 1, -- bumped when the same filename is uploaded again
     created_at        TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     updated_at        TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
@@ -44,12 +45,22 @@ CREATE TABLE IF NOT EXISTS chunks (
     document_id   UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
     chunk_index   INT NOT NULL,
     text          TEXT NOT NULL,
+    content_hash  TEXT, -- md5(text); lets a new document version keep unchanged chunks
     embedding     VECTOR(768) NOT NULL, -- adjust dimension to your embedding size
     metadata      JSONB,
     created_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+-- columns added after the first release
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 CREATE INDEX IF NOT EXISTS idx_chunks_tenant_document ON chunks(tenant_id, document_id);
+-- Filtered retrieval (QueryRequest.filters): page ranges of a tenant's chunks,
+-- filename / upload date predicates on documents
+CREATE INDEX IF NOT EXISTS idx_chunks_tenant_page ON chunks(tenant_id, ((metadata->>'page')::int));
+CREATE INDEX IF NOT EXISTS idx_documents_tenant_filename ON documents(tenant_id, original_filename);
+CREATE INDEX IF NOT EXISTS idx_documents_tenant_updated ON documents(tenant_id, updated_at);
 -- Later you might add a vector index for fast similarity search, e.g.:
 -- CREATE INDEX IF NOT EXISTS idx_chunks_embedding ON chunks USING ivfflat (embedding vector_cosine_ops);
 
@@ -64,6 +75,9 @@ CREATE TABLE IF NOT EXISTS audit_logs (
 );
 
 CREATE INDEX IF NOT EXISTS idx_audit_logs_tenant_time ON audit_logs(tenant_id, created_at);
+-- startup warm-up ranks tenants by recent queries across all tenants
+-- (warmup.fetch_active_tenants); tenant_id last allows an index-only scan
+CREATE INDEX IF NOT EXISTS idx_audit_logs_action_time ON audit_logs(action, created_at, tenant_id);
 """
 
 def get_connection():
@@ -0,0 +1,542 @@
+# backend/loadtest/__main__.py
+"""
+Load-test harness for the backend.
+
+Starts the FastAPI app in-process (uvicorn on a random local port), either against
+the Postgres configured in app.config or against the in-memory stand-in from
+loadtest.fakedb, seeds tenants/users/documents through the public API and then
+drives mixed /query + /upload traffic with authenticated tokens.
+
+Usage (from backend/):
+    python -m loadtest --db fake --tenants 4 --docs-per-tenant 5 --concurrency 1,8,32
+    python -m loadtest --db postgres --duration 30 --upload-ratio 0.05
+    python -m loadtest --restart --concurrency 8   # also measure a warm restart
+
+Per-tenant rate limits apply as configured (429s are counted separately);
+set QUERY_RATE_PER_TENANT=0 / INGEST_RATE_PER_TENANT=0 to measure raw capacity.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .fakedb import ConnectionStats, FakeDatabase, FakePool
+
+VOCABULARY = (
+    "urlaub antrag arbeitszeit gehalt kündigung vertrag mitarbeiter homeoffice "
+    "reisekosten abrechnung datenschutz sicherheit schulung krankmeldung überstunden "
+    "probezeit betriebsrat zeiterfassung dienstwagen fortbildung bonus elternzeit "
+    "kantine parkplatz laptop passwort zugang freigabe rechnung lieferant budget"
+).split()
+
+
+# --- synthetic documents ---
+
+def _random_sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Build a minimal text PDF (one Helvetica text block per page) without extra dependencies.
+    """
+    objects: List[bytes] = []
+    n_pages = len(pages)
+    # object numbers: 1 catalog, 2 pages, 3 font, then (page, content) pairs
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n_pages))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, lines in enumerate(pages):
+        ops = ["BT", "/F1 10 Tf", "14 TL", "40 800 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_document(rng: random.Random, pages: int, lines_per_page: int = 40) -> bytes:
+    return make_pdf([[_random_sentence(rng) for _ in range(lines_per_page)] for _ in range(pages)])
+
+
+# --- HTTP client (stdlib only) ---
+
+def _request(
+    method: str,
+    url: str,
+    body: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 120.0,
+) -> Tuple[int, bytes]:
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _post_json(url: str, payload: Dict[str, Any], token: Optional[str] = None) -> Tuple[int, bytes]:
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return _request("POST", url, json.dumps(payload).encode(), headers)
+
+
+def _post_json_stream(url: str, payload: Dict[str, Any], token: str) -> Tuple[int, float]:
+    """
+    POST to an SSE endpoint and read the stream to the end.
+    Returns (status, seconds until the first event arrived).
+    """
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST", headers=headers)
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120.0) as resp:
+            resp.readline()
+            ttfb = time.perf_counter() - t0
+            while resp.read(65536):
+                pass
+            return resp.status, ttfb
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, time.perf_counter() - t0
+
+
+def _post_file(url: str, filename: str, content: bytes, token: str) -> Tuple[int, bytes]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Authorization": f"Bearer {token}",
+    }
+    return _request("POST", url, body, headers)
+
+
+# --- server + database wiring ---
+
+def use_fake_database(db: FakeDatabase):
+    """
+    Make the app's connection pool hand out stand-in connections.
+    """
+    from app import db as app_db
+    from app.config import settings
+
+    app_db.create_pool = lambda: FakePool(db, max_size=settings.DB_POOL_MAX_SIZE)
+
+
+class PostgresConnectionSampler:
+    """
+    Polls pg_stat_activity to track how many connections the app holds on a real Postgres.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.stats = ConnectionStats()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        from app.db import get_connection
+
+        conn = get_connection()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                while not self._stop.is_set():
+                    cur.execute(
+                        "SELECT count(*) AS n FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                    )
+                    n = cur.fetchone()["n"]
+                    self.stats.current = n
+                    self.stats.peak = max(self.stats.peak, n)
+                    time.sleep(self.interval)
+        finally:
+            conn.close()
+
+
+def start_server(documents_dir: str) -> Tuple[Any, threading.Thread, str]:
+    import uvicorn
+    from app import main
+    from app.services import rag
+
+    main.DOCUMENTS_DIR = documents_dir
+    rag.index_cache.snapshot_dir = os.path.join(documents_dir, "indexes")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+
+    config = uvicorn.Config(main.app, log_level="warning", access_log=False, backlog=4096)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+# --- seeding ---
+
+def seed(base: str, args, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    Create tenants, users and documents through the API.
+    Returns one session dict per user: {tenant_id, email, token}.
+    """
+    sessions: List[Dict[str, Any]] = []
+    password = "loadtest-password"
+    run_id = uuid.uuid4().hex[:8]
+
+    for t in range(args.tenants):
+        status, body = _post_json(f"{base}/tenants", {"name": f"loadtest-{run_id}-{t}"})
+        if status != 200:
+            raise RuntimeError(f"tenant creation failed: {status} {body[:200]!r}")
+        tenant_id = json.loads(body)["id"]
+        for u in range(args.users_per_tenant):
+            email = f"user{u}-{run_id}@loadtest.example.com"
+            status, body = _post_json(
+                f"{base}/users",
+                {"tenant_id": tenant_id, "email": email, "password": password, "role": "user"},
+            )
+            if status != 200:
+                raise RuntimeError(f"user creation failed: {status} {body[:200]!r}")
+            status, body = _post_json(
+                f"{base}/auth/login", {"tenant_id": tenant_id, "email": email, "password": password}
+            )
+            if status != 200:
+                raise RuntimeError(f"login failed: {status} {body[:200]!r}")
+            sessions.append({"tenant_id": tenant_id, "email": email, "token": json.loads(body)["access_token"]})
+
+    first_per_tenant = {s["tenant_id"]: s for s in reversed(sessions)}
+    uploads = [
+        (f"seed-{d}.pdf", make_document(rng, args.pages_per_doc), s["token"])
+        for s in first_per_tenant.values()
+        for d in range(args.docs_per_tenant)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(uploads)))) as pool:
+        for status, body in pool.map(lambda u: _post_file(f"{base}/upload", *u), uploads):
+            if status != 200:
+                raise RuntimeError(f"seed upload failed: {status} {body[:200]!r}")
+    return sessions
+
+
+# --- restart ---
+
+def query_each_tenant(base: str, sessions: List[Dict[str, Any]]) -> List[float]:
+    """
+    One query per tenant, all at once; returns the latencies in seconds.
+    """
+    first_per_tenant = list({s["tenant_id"]: s for s in sessions}.values())
+
+    def one(session: Dict[str, Any]) -> float:
+        t0 = time.perf_counter()
+        status, body = _post_json(f"{base}/query", {"question": " ".join(VOCABULARY[:3])}, session["token"])
+        if status != 200:
+            raise RuntimeError(f"query failed: {status} {body[:200]!r}")
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=len(first_per_tenant)) as pool:
+        return list(pool.map(one, first_per_tenant))
+
+
+def measure_restart(server, thread, documents_dir: str, sessions: List[Dict[str, Any]]):
+    """
+    Stop the server (indexes are snapshotted on shutdown), start it again and measure
+    time to accept traffic, first-query latency per tenant while warm-up runs,
+    time until warm-up is done and the query latency after that.
+    Returns (server, thread, base, report).
+    """
+    query_each_tenant(server_base(server), sessions)  # query activity + snapshots to restart from
+    server.should_exit = True
+    thread.join()
+
+    t0 = time.perf_counter()
+    server, thread, base = start_server(documents_dir)
+    accepting = time.perf_counter() - t0
+    first = query_each_tenant(base, sessions)
+
+    deadline = time.perf_counter() + 120.0
+    metrics: Dict[str, Any] = {}
+    while time.perf_counter() < deadline:
+        status, body = _request("GET", f"{base}/metrics")
+        metrics = json.loads(body) if status == 200 else {}
+        if metrics.get("warmup", {}).get("state") in ("done", "off"):
+            break
+        time.sleep(0.05)
+    steady = query_each_tenant(base, sessions)
+    report = {
+        "accepting_s": round(accepting, 3),
+        "first_query_p50_ms": round(percentile(first, 50) * 1000, 2),
+        "first_query_max_ms": round(max(first) * 1000, 2),
+        "after_warmup_p50_ms": round(percentile(steady, 50) * 1000, 2),
+        "after_warmup_max_ms": round(max(steady) * 1000, 2),
+        "warmup": metrics.get("warmup"),
+        "index": metrics.get("index"),
+    }
+    return server, thread, base, report
+
+
+def server_base(server) -> str:
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    return f"http://{host}:{port}"
+
+
+def print_restart(report: Dict[str, Any]):
+    w = report.get("warmup") or {}
+    idx = report.get("index") or {}
+    print(
+        f"restart: accepting after {report['accepting_s']}s, warm-up ready after {w.get('ready_after_s')}s "
+        f"({w.get('tenants_loaded')}/{w.get('tenants_planned')} tenants, imports {w.get('imports_s')}s)"
+    )
+    print(
+        f"restart: first query per tenant p50 {report['first_query_p50_ms']} ms, max {report['first_query_max_ms']} ms; "
+        f"after warm-up p50 {report['after_warmup_p50_ms']} ms, max {report['after_warmup_max_ms']} ms"
+    )
+    print(
+        f"restart: index loads {idx.get('loads')}, from snapshot {idx.get('snapshot_loads')}, "
+        f"miss wait max {idx.get('miss_wait_max_ms')} ms"
+    )
+
+
+# --- traffic ---
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run_level(
+    base: str,
+    sessions: List[Dict[str, Any]],
+    concurrency: int,
+    args,
+    upload_docs: List[bytes],
+    conn_stats: ConnectionStats,
+) -> Dict[str, Any]:
+    """
+    Run `concurrency` closed-loop clients for args.duration seconds.
+    """
+    latencies: Dict[str, List[float]] = {"query": [], "upload": []}
+    ttfb: List[float] = []
+    errors: Dict[str, int] = {"query": 0, "upload": 0}
+    throttled: Dict[str, int] = {"query": 0, "upload": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    conn_stats.reset_peak()
+
+    def client(worker: int):
+        rng = random.Random(args.seed * 1000 + worker)
+        while time.perf_counter() < deadline:
+            session = rng.choice(sessions)
+            if rng.random() < args.upload_ratio:
+                kind = "upload"
+                t0 = time.perf_counter()
+                status, _ = _post_file(
+                    f"{base}/upload", f"load-{uuid.uuid4().hex[:8]}.pdf", rng.choice(upload_docs), session["token"]
+                )
+            else:
+                kind = "query"
+                question = " ".join(rng.sample(VOCABULARY, 3))
+                payload = {"question": question, "top_k": args.top_k}
+                t0 = time.perf_counter()
+                if args.stream:
+                    status, first = _post_json_stream(f"{base}/query/stream", payload, session["token"])
+                else:
+                    status, _ = _post_json(f"{base}/query", payload, session["token"])
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if status == 200:
+                    latencies[kind].append(elapsed)
+                    if kind == "query" and args.stream:
+                        ttfb.append(first)
+                elif status == 429:
+                    throttled[kind] += 1
+                else:
+                    errors[kind] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    result: Dict[str, Any] = {"concurrency": concurrency, "seconds": round(wall, 3)}
+    total = 0
+    for kind, values in latencies.items():
+        total += len(values)
+        result[kind] = {
+            "ok": len(values),
+            "errors": errors[kind],
+            "throttled": throttled[kind],
+            "rps": round(len(values) / wall, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p90_ms": round(percentile(values, 90) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(max(values, default=0.0) * 1000, 2),
+        }
+    if ttfb:
+        result["query"]["ttfb_p50_ms"] = round(percentile(ttfb, 50) * 1000, 2)
+        result["query"]["ttfb_p99_ms"] = round(percentile(ttfb, 99) * 1000, 2)
+    result["rps"] = round(total / wall, 2)
+    result["db_connections"] = conn_stats.snapshot()
+    status, body = _request("GET", f"{base}/metrics")
+    if status == 200:
+        result["server_metrics"] = json.loads(body)
+    return result
+
+
+def print_report(results: List[Dict[str, Any]]):
+    header = f"{'conc':>5} {'endpoint':>8} {'ok':>7} {'err':>5} {'429':>5} {'rps':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'db peak':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        for kind in ("query", "upload"):
+            m = r[kind]
+            if not m["ok"] and not m["errors"] and not m["throttled"]:
+                continue
+            print(
+                f"{r['concurrency']:>5} {kind:>8} {m['ok']:>7} {m['errors']:>5} {m['throttled']:>5} {m['rps']:>9} "
+                f"{m['p50_ms']:>9} {m['p90_ms']:>9} {m['p99_ms']:>9} {m['max_ms']:>9} "
+                f"{r['db_connections']['peak']:>8}"
+            )
+    for r in results:
+        if "ttfb_p50_ms" in r["query"]:
+            print(
+                f"{r['concurrency']:>5} query time-to-first-event: "
+                f"p50 {r['query']['ttfb_p50_ms']} ms, p99 {r['query']['ttfb_p99_ms']} ms"
+            )
+        for name, ex in r.get("server_metrics", {}).get("executors", {}).items():
+            print(
+                f"{r['concurrency']:>5} executor {name}: peak pending {ex['peak_pending']}/{ex['max_pending']}, "
+                f"rejected {ex['rejected']}"
+            )
+        au = r.get("server_metrics", {}).get("audit")
+        if au:
+            print(
+                f"{r['concurrency']:>5} audit log: written {au['written']}, buffered {au['buffered']}, "
+                f"dropped {au['dropped']}, failed {au['failed']}"
+            )
+    best = max(results, key=lambda r: r["rps"])
+    print(f"\nmax throughput: {best['rps']} req/s at concurrency {best['concurrency']}")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__.split("\n\n")[0])
+    p.add_argument("--db", choices=["fake", "postgres"], default="fake")
+    p.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated round-trip per statement (fake db only)")
+    p.add_argument("--tenants", type=int, default=3)
+    p.add_argument("--users-per-tenant", type=int, default=2)
+    p.add_argument("--docs-per-tenant", type=int, default=4)
+    p.add_argument("--pages-per-doc", type=int, default=5)
+    p.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts to sweep")
+    p.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    p.add_argument("--upload-ratio", type=float, default=0.02, help="share of requests that are uploads")
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--stream", action="store_true", help="send queries to /query/stream and record time to first event")
+    p.add_argument("--restart", action="store_true", help="restart the server after seeding and measure the warm start")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--json", help="also write the results to this file")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    sampler = None
+    if args.db == "fake":
+        fake = FakeDatabase(latency_ms=args.db_latency_ms)
+        use_fake_database(fake)
+        conn_stats = fake.stats
+    else:
+        sampler = PostgresConnectionSampler()
+        sampler.start()
+        conn_stats = sampler.stats
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-docs-") as documents_dir:
+        t0 = time.perf_counter()
+        importlib.import_module("app.main")
+        print(f"import app.main: {time.perf_counter() - t0:.2f}s")
+        t0 = time.perf_counter()
+        server, thread, base = start_server(documents_dir)
+        print(f"server up at {base} in {time.perf_counter() - t0:.2f}s (db={args.db})")
+
+        try:
+            t0 = time.perf_counter()
+            sessions = seed(base, args, rng)
+            print(
+                f"seeded {args.tenants} tenants, {len(sessions)} users, "
+                f"{args.tenants * args.docs_per_tenant} documents in {time.perf_counter() - t0:.2f}s"
+            )
+
+            restart = None
+            if args.restart:
+                server, thread, base, restart = measure_restart(server, thread, documents_dir, sessions)
+                print_restart(restart)
+
+            upload_docs = [make_document(rng, args.pages_per_doc) for _ in range(4)]
+            results = []
+            for level in (int(c) for c in args.concurrency.split(",") if c.strip()):
+                results.append(run_level(base, sessions, level, args, upload_docs, conn_stats))
+            print()
+            print_report(results)
+            if args.json:
+                with open(args.json, "w") as f:
+                    json.dump({"args": vars(args), "restart": restart, "results": results}, f, indent=2)
+        finally:
+            server.should_exit = True
+            thread.join()
+            if sampler:
+                sampler.stop()
+
+
+if __name__ == "__main__":
+    main()
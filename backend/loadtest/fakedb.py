@@ -0,0 +1,646 @@
+# backend/loadtest/fakedb.py
+
+import asyncio
+import hashlib
+import re
+import threading
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# In-process stand-in for Postgres.
+# It does not parse SQL: every statement the app issues is registered below
+# (whitespace-normalized) together with a handler working on in-memory tables.
+# Statements that are not registered raise, so the harness breaks loudly when
+# the app's SQL changes instead of silently measuring something else.
+
+
+class FakeDBError(Exception):
+    pass
+
+
+class UniqueViolation(FakeDBError):
+    pass
+
+
+def _norm(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def _unwrap(value: Any) -> Any:
+    # psycopg.types.json.Jsonb keeps the wrapped object in .obj
+    return getattr(value, "obj", value)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ConnectionStats:
+    """
+    Counts connections checked out of the stand-in pool (total, currently held, peak).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.current = 0
+        self.peak = 0
+
+    def on_open(self):
+        with self._lock:
+            self.opened += 1
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def on_close(self):
+        with self._lock:
+            self.current -= 1
+
+    def reset_peak(self):
+        with self._lock:
+            self.peak = self.current
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"opened": self.opened, "open": self.current, "peak": self.peak}
+
+
+_HANDLERS: Dict[str, Callable[["FakeDatabase", Tuple[Any, ...]], List[Dict[str, Any]]]] = {}
+# statements built dynamically (e.g. filtered retrieval): handler(db, rest_of_sql, params)
+_PREFIX_HANDLERS: List[Tuple[str, Callable[..., List[Dict[str, Any]]]]] = []
+
+
+def statement(sql: str):
+    def register(fn):
+        _HANDLERS[_norm(sql)] = fn
+        return fn
+    return register
+
+
+def statement_prefix(sql: str):
+    def register(fn):
+        _PREFIX_HANDLERS.append((_norm(sql), fn))
+        return fn
+    return register
+
+
+class FakeDatabase:
+    """
+    In-memory tables for tenants, users, documents, chunks and audit_logs.
+    All statements run under one lock, which is good enough for a load-test stand-in.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.stats = ConnectionStats()
+        self.tenants: Dict[str, Dict[str, Any]] = {}
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.chunks: List[Dict[str, Any]] = []
+        self.audit_logs: List[Dict[str, Any]] = []
+
+    def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> List[Dict[str, Any]]:
+        norm = _norm(sql)
+        params = tuple(_unwrap(p) for p in (params or ()))
+        handler = _HANDLERS.get(norm)
+        if handler is not None:
+            with self.lock:
+                return handler(self, params)
+        for prefix, prefix_handler in _PREFIX_HANDLERS:
+            if norm.startswith(prefix):
+                with self.lock:
+                    return prefix_handler(self, norm[len(prefix):], params)
+        raise FakeDBError(f"statement not supported by the stand-in: {norm[:120]}")
+
+    def copy_rows(self, sql: str, rows: List[Tuple[Any, ...]]):
+        # COPY handlers receive the list of rows as their params
+        handler = _HANDLERS.get(_norm(sql))
+        if handler is None:
+            raise FakeDBError(f"statement not supported by the stand-in: {_norm(sql)[:120]}")
+        with self.lock:
+            handler(self, rows)
+
+
+class FakeCopy:
+    def __init__(self):
+        self.rows: List[Tuple[Any, ...]] = []
+
+    async def write_row(self, row):
+        self.rows.append(tuple(_unwrap(v) for v in row))
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection"):
+        self.conn = conn
+        self._rows: List[Dict[str, Any]] = []
+
+    async def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None):
+        if self.conn.db.latency:
+            await asyncio.sleep(self.conn.db.latency)
+        self._rows = self.conn.db.execute(sql, params)
+        return self
+
+    async def executemany(self, sql: str, params_seq):
+        # pipelined on a real server: one round-trip for the whole batch
+        if self.conn.db.latency:
+            await asyncio.sleep(self.conn.db.latency)
+        for params in params_seq:
+            self.conn.db.execute(sql, params)
+        self._rows = []
+
+    @asynccontextmanager
+    async def copy(self, sql: str) -> AsyncIterator["FakeCopy"]:
+        copy = FakeCopy()
+        yield copy
+        if self.conn.db.latency:
+            await asyncio.sleep(self.conn.db.latency)
+        self.conn.db.copy_rows(sql, copy.rows)
+
+    async def fetchone(self) -> Optional[Dict[str, Any]]:
+        return self._rows[0] if self._rows else None
+
+    async def fetchall(self) -> List[Dict[str, Any]]:
+        return list(self._rows)
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class FakeConnection:
+    """
+    Mimics the subset of a psycopg AsyncConnection (dict_row) the app uses.
+    Writes are applied immediately; commit/rollback are no-ops.
+    """
+
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    async def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> FakeCursor:
+        return await self.cursor().execute(sql, params)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakePool:
+    """
+    Stand-in for psycopg_pool.AsyncConnectionPool: at most max_size connections
+    are handed out at once, further requests wait (as they would on the real pool).
+    """
+
+    def __init__(self, db: FakeDatabase, max_size: int):
+        self.db = db
+        self.max_size = max_size
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    async def open(self):
+        self._sem = asyncio.Semaphore(self.max_size)
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[FakeConnection]:
+        async with self._sem:
+            self.db.stats.on_open()
+            try:
+                yield FakeConnection(self.db)
+            finally:
+                self.db.stats.on_close()
+
+
+# --- statements used by crud / auth / main / ingestion / rag ---
+
+@statement("INSERT INTO tenants (name) VALUES (%s) RETURNING id, name")
+def _insert_tenant(db: FakeDatabase, params):
+    (name,) = params
+    row = {"id": str(uuid.uuid4()), "name": name, "created_at": _now()}
+    db.tenants[row["id"]] = row
+    return [{"id": row["id"], "name": name}]
+
+
+@statement("SELECT 1 FROM tenants WHERE id = %s")
+def _tenant_exists(db: FakeDatabase, params):
+    (tenant_id,) = params
+    return [{"?column?": 1}] if tenant_id in db.tenants else []
+
+
+@statement("SELECT id, name FROM tenants ORDER BY created_at")
+def _list_tenants(db: FakeDatabase, params):
+    rows = sorted(db.tenants.values(), key=lambda r: r["created_at"])
+    return [{"id": r["id"], "name": r["name"]} for r in rows]
+
+
+@statement(
+    """
+    INSERT INTO users (tenant_id, email, password_hash, role)
+    VALUES (%s, %s, %s, %s)
+    RETURNING id, tenant_id, email, role
+    """
+)
+def _insert_user(db: FakeDatabase, params):
+    tenant_id, email, password_hash, role = params
+    if tenant_id not in db.tenants:
+        raise FakeDBError("insert or update on table \"users\" violates foreign key constraint")
+    for u in db.users.values():
+        if u["tenant_id"] == tenant_id and u["email"] == email:
+            raise UniqueViolation("duplicate key value violates unique constraint \"users_unique_email_per_tenant\"")
+    row = {
+        "id": str(uuid.uuid4()),
+        "tenant_id": tenant_id,
+        "email": email,
+        "password_hash": password_hash,
+        "role": role,
+        "created_at": _now(),
+    }
+    db.users[row["id"]] = row
+    return [{k: row[k] for k in ("id", "tenant_id", "email", "role")}]
+
+
+@statement(
+    """
+    SELECT id, tenant_id, email, password_hash, role
+    FROM users
+    WHERE tenant_id = %s AND email = %s
+    """
+)
+def _user_by_email(db: FakeDatabase, params):
+    tenant_id, email = params
+    for u in db.users.values():
+        if u["tenant_id"] == tenant_id and u["email"] == email:
+            return [{k: u[k] for k in ("id", "tenant_id", "email", "password_hash", "role")}]
+    return []
+
+
+@statement(
+    """
+    SELECT id, tenant_id, email, role
+    FROM users
+    WHERE id = %s
+    """
+)
+def _user_by_id(db: FakeDatabase, params):
+    (user_id,) = params
+    u = db.users.get(user_id)
+    return [{k: u[k] for k in ("id", "tenant_id", "email", "role")}] if u else []
+
+
+@statement(
+    """
+    INSERT INTO documents (tenant_id, title, original_filename, storage_path, status)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id
+    """
+)
+def _insert_document(db: FakeDatabase, params):
+    tenant_id, title, original_filename, storage_path, status = params
+    row = {
+        "id": str(uuid.uuid4()),
+        "tenant_id": tenant_id,
+        "title": title,
+        "original_filename": original_filename,
+        "storage_path": storage_path,
+        "status": status,
+        "version": 1,
+        "created_at": _now(),
+        "updated_at": _now(),
+    }
+    db.documents[row["id"]] = row
+    return [{"id": row["id"]}]
+
+
+@statement(
+    """
+    UPDATE documents
+    SET storage_path = %s
+    WHERE id = %s
+    """
+)
+def _update_document_path(db: FakeDatabase, params):
+    storage_path, document_id = params
+    db.documents[document_id]["storage_path"] = storage_path
+    return []
+
+
+def _set_status(status: str, touch: bool):
+    def handler(db: FakeDatabase, params):
+        (document_id,) = params
+        db.documents[document_id]["status"] = status
+        if touch:
+            db.documents[document_id]["updated_at"] = _now()
+        return []
+    return handler
+
+
+statement(
+    """
+    UPDATE documents
+    SET status = 'ready', updated_at = NOW()
+    WHERE id = %s
+    """
+)(_set_status("ready", touch=True))
+
+statement(
+    """
+    UPDATE documents
+    SET status = 'error'
+    WHERE id = %s
+    """
+)(_set_status("error", touch=False))
+
+
+def _ready_documents(db: FakeDatabase, tenant_id: str) -> List[Dict[str, Any]]:
+    return [d for d in db.documents.values() if d["tenant_id"] == tenant_id and d["status"] == "ready"]
+
+
+@statement(
+    """
+    SELECT count(*) AS n, coalesce(sum(hashtext(id::text || updated_at::text)), 0) AS checksum
+    FROM documents
+    WHERE tenant_id = %s AND status = 'ready'
+    """
+)
+def _index_version(db: FakeDatabase, params):
+    (tenant_id,) = params
+    docs = _ready_documents(db, tenant_id)
+    # any stable per-row hash will do; crc32 stands in for hashtext
+    checksum = sum(zlib.crc32(f"{d['id']}{d['updated_at'].isoformat()}".encode()) for d in docs)
+    return [{"n": len(docs), "checksum": checksum}]
+
+
+@statement(
+    """
+    SELECT id, updated_at
+    FROM documents
+    WHERE tenant_id = %s AND status = 'ready'
+    """
+)
+def _list_ready_documents(db: FakeDatabase, params):
+    (tenant_id,) = params
+    return [{"id": d["id"], "updated_at": d["updated_at"]} for d in _ready_documents(db, tenant_id)]
+
+
+@statement(
+    """
+    INSERT INTO chunks (tenant_id, document_id, chunk_index, text, content_hash, embedding, metadata)
+    VALUES (%s, %s, %s, %s, %s, %s::vector, %s)
+    """
+)
+def _insert_chunk(db: FakeDatabase, params):
+    tenant_id, document_id, chunk_index, text, content_hash, _embedding, metadata = params
+    db.chunks.append(
+        {
+            "id": str(uuid.uuid4()),
+            "tenant_id": tenant_id,
+            "document_id": document_id,
+            "chunk_index": chunk_index,
+            "text": text,
+            "content_hash": content_hash,
+            "metadata": metadata,
+            "created_at": _now(),
+        }
+    )
+    return []
+
+
+# --- new document versions (ingestion.find_ready_document / reingest_document) ---
+
+@statement(
+    """
+    SELECT id, version
+    FROM documents
+    WHERE tenant_id = %s AND original_filename = %s AND status = 'ready'
+    ORDER BY created_at DESC
+    LIMIT 1
+    """
+)
+def _ready_document_by_filename(db: FakeDatabase, params):
+    tenant_id, original_filename = params
+    docs = [
+        d for d in _ready_documents(db, tenant_id) if d["original_filename"] == original_filename
+    ]
+    docs.sort(key=lambda d: d["created_at"], reverse=True)
+    return [{"id": d["id"], "version": d["version"]} for d in docs[:1]]
+
+
+@statement(
+    """
+    SELECT version
+    FROM documents
+    WHERE id = %s
+    FOR UPDATE
+    """
+)
+def _lock_document(db: FakeDatabase, params):
+    (document_id,) = params
+    d = db.documents.get(document_id)
+    return [{"version": d["version"]}] if d else []
+
+
+@statement(
+    """
+    SELECT id, chunk_index, coalesce(content_hash, md5(text)) AS content_hash, metadata
+    FROM chunks
+    WHERE document_id = %s
+    """
+)
+def _document_chunk_hashes(db: FakeDatabase, params):
+    (document_id,) = params
+    return [
+        {
+            "id": c["id"],
+            "chunk_index": c["chunk_index"],
+            "content_hash": c.get("content_hash") or hashlib.md5(c["text"].encode("utf-8")).hexdigest(),
+            "metadata": c["metadata"],
+        }
+        for c in db.chunks
+        if c["document_id"] == document_id
+    ]
+
+
+@statement(
+    """
+    DELETE FROM chunks
+    WHERE id = ANY(%s::uuid[])
+    """
+)
+def _delete_chunks(db: FakeDatabase, params):
+    (ids,) = params
+    ids = {str(i) for i in ids}
+    db.chunks = [c for c in db.chunks if c["id"] not in ids]
+    return []
+
+
+@statement(
+    """
+    UPDATE chunks
+    SET chunk_index = %s, metadata = %s, content_hash = coalesce(content_hash, md5(text))
+    WHERE id = %s
+    """
+)
+def _move_chunk(db: FakeDatabase, params):
+    chunk_index, metadata, chunk_id = params
+    for c in db.chunks:
+        if c["id"] == chunk_id:
+            c["chunk_index"] = chunk_index
+            c["metadata"] = metadata
+            c["content_hash"] = c.get("content_hash") or hashlib.md5(c["text"].encode("utf-8")).hexdigest()
+    return []
+
+
+@statement(
+    """
+    UPDATE documents
+    SET version = %s, updated_at = NOW()
+    WHERE id = %s
+    """
+)
+def _bump_version(db: FakeDatabase, params):
+    version, document_id = params
+    db.documents[document_id]["version"] = version
+    db.documents[document_id]["updated_at"] = _now()
+    return []
+
+
+def _aware(ts: datetime) -> datetime:
+    # naive timestamps compare as UTC (the server's session time zone)
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _page(chunk: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int((chunk.get("metadata") or {}).get("page"))
+    except (TypeError, ValueError):
+        return None
+
+
+# rag.build_chunks_query: base select + AND-ed conditions from CHUNK_FILTER_CONDITIONS,
+# or a parenthesized group of them OR'ed together (page ranges)
+_CHUNK_FILTERS: Dict[str, Tuple[int, Callable[[Dict[str, Any], Dict[str, Any], List[Any]], bool]]] = {
+    "document_ids": (1, lambda c, d, p: c["document_id"] in {str(x) for x in p[0]}),
+    "filenames": (1, lambda c, d, p: d["original_filename"] in p[0]),
+    "pages": (2, lambda c, d, p: _page(c) is not None and p[0] <= _page(c) <= p[1]),
+    "uploaded_after": (1, lambda c, d, p: d["updated_at"] >= p[0]),
+    "uploaded_before": (1, lambda c, d, p: d["updated_at"] < p[0]),
+}
+
+
+def _select_chunks(db: FakeDatabase, tail: str, params):
+    from app.services.rag import CHUNK_FILTER_CONDITIONS, CHUNKS_ORDER_BY
+
+    head = "WHERE c.tenant_id = %s AND d.status = 'ready'"
+    tail = tail.strip()
+    if not tail.startswith(head) or not tail.endswith(_norm(CHUNKS_ORDER_BY)):
+        raise FakeDBError(f"unexpected chunk query: {tail[:120]}")
+    tail = tail[len(head):-len(_norm(CHUNKS_ORDER_BY))].strip()
+    tenant_id, rest = params[0], list(params[1:])
+
+    fragments = {_norm(cond): name for name, cond in CHUNK_FILTER_CONDITIONS.items()}
+
+    def condition():
+        nonlocal tail, rest
+        for fragment, name in fragments.items():
+            if tail.startswith(fragment):
+                n_params, pred = _CHUNK_FILTERS[name]
+                p = rest[:n_params]
+                rest = rest[n_params:]
+                tail = tail[len(fragment):].strip()
+                return lambda c, d: pred(c, d, p)
+        raise FakeDBError(f"unsupported chunk filter: {tail[:120]}")
+
+    predicates = []
+    while tail:
+        if not tail.startswith("AND "):
+            raise FakeDBError(f"unexpected chunk query: {tail[:120]}")
+        tail = tail[4:]
+        if not tail.startswith("(") or any(tail.startswith(f) for f in fragments):
+            predicates.append(condition())
+            continue
+        tail = tail[1:]
+        alternatives = [condition()]
+        while tail.startswith("OR "):
+            tail = tail[3:]
+            alternatives.append(condition())
+        if not tail.startswith(")"):
+            raise FakeDBError(f"unexpected chunk query: {tail[:120]}")
+        tail = tail[1:].strip()
+        predicates.append(lambda c, d, alts=alternatives: any(alt(c, d) for alt in alts))
+
+    out = []
+    for c in db.chunks:
+        if c["tenant_id"] != tenant_id:
+            continue
+        d = db.documents.get(c["document_id"], {})
+        if d.get("status") == "ready" and all(pred(c, d) for pred in predicates):
+            row = {k: c[k] for k in ("document_id", "chunk_index", "text", "metadata")}
+            row.update({k: d[k] for k in ("original_filename", "created_at", "updated_at")})
+            out.append(row)
+    out.sort(key=lambda r: (r["document_id"], r["chunk_index"]))
+    return out
+
+
+statement_prefix(
+    """
+    SELECT c.document_id, c.chunk_index, c.text, c.metadata,
+           d.original_filename, d.created_at, d.updated_at
+    FROM chunks c
+    JOIN documents d ON d.id = c.document_id
+    """
+)(_select_chunks)
+
+
+@statement("COPY audit_logs (tenant_id, user_id, action, details, created_at) FROM STDIN")
+def _copy_audit_logs(db: FakeDatabase, rows):
+    # all-or-nothing, like COPY
+    for tenant_id, user_id, *_ in rows:
+        if tenant_id not in db.tenants or (user_id is not None and user_id not in db.users):
+            raise FakeDBError("insert or update on table \"audit_logs\" violates foreign key constraint")
+    for tenant_id, user_id, action, details, created_at in rows:
+        db.audit_logs.append(
+            {
+                "id": str(uuid.uuid4()),
+                "tenant_id": tenant_id,
+                "user_id": user_id,
+                "action": action,
+                "details": details,
+                "created_at": created_at,
+            }
+        )
+    return []
+
+
+@statement(
+    """
+    SELECT tenant_id, count(*) AS n
+    FROM audit_logs
+    WHERE action = 'query' AND created_at > NOW() - make_interval(days => %s)
+    GROUP BY tenant_id
+    ORDER BY n DESC
+    LIMIT %s
+    """
+)
+def _active_tenants(db: FakeDatabase, params):
+    days, limit = params
+    since = _now() - timedelta(days=days)
+    counts: Dict[str, int] = {}
+    for row in db.audit_logs:
+        if row["action"] == "query" and _aware(row["created_at"]) > since:
+            counts[row["tenant_id"]] = counts.get(row["tenant_id"], 0) + 1
+    ranked = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return [{"tenant_id": t, "n": n} for t, n in ranked]
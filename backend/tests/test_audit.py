@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app import db
+from app.services.audit import AuditLogWriter
+from loadtest.fakedb import FakeDatabase, FakePool
+
+TENANT = "00000000-0000-0000-0000-000000000001"
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDatabase()
+    fake.tenants[TENANT] = {"id": TENANT, "name": "t", "created_at": datetime.now(timezone.utc)}
+    monkeypatch.setattr(db, "pool", FakePool(fake, max_size=2))
+    return fake
+
+
+def test_events_over_capacity_are_dropped():
+    writer = AuditLogWriter(capacity=3, batch_size=10, flush_interval=60)
+    for i in range(5):
+        writer.log(TENANT, None, "query", {"i": i})
+    stats = writer.stats()
+    assert (stats["buffered"], stats["enqueued"], stats["dropped"]) == (3, 3, 2)
+
+
+def test_stop_flushes_the_buffer(fake_db):
+    writer = AuditLogWriter(capacity=100, batch_size=50, flush_interval=60)
+
+    async def scenario():
+        await db.pool.open()
+        await writer.start()
+        for i in range(3):
+            writer.log(TENANT, None, "query", {"i": i})
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert [row["details"] for row in fake_db.audit_logs] == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert (writer.written, writer.failed, writer.stats()["buffered"]) == (3, 0, 0)
+
+
+def test_full_batch_wakes_the_writer(fake_db):
+    writer = AuditLogWriter(capacity=100, batch_size=2, flush_interval=60)
+
+    async def scenario():
+        await db.pool.open()
+        await writer.start()
+        writer.log(TENANT, None, "query")
+        writer.log(TENANT, None, "query")
+        for _ in range(100):
+            if writer.written:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.written == 2 and writer.flushes >= 1
+
+
+def test_failed_batches_are_counted(fake_db):
+    writer = AuditLogWriter(capacity=100, batch_size=2, flush_interval=60)
+
+    async def scenario():
+        await db.pool.open()
+        await writer.start()
+        writer.log("00000000-0000-0000-0000-00000000dead", None, "query")  # no such tenant
+        writer.log(TENANT, None, "query")
+        writer.log(TENANT, None, "login")
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.failed == 1
+    assert writer.written == 2
+    assert [row["action"] for row in fake_db.audit_logs] == ["query", "login"]
+
+
+def test_only_the_rejected_row_of_a_batch_is_dropped(fake_db):
+    writer = AuditLogWriter(capacity=100, batch_size=10, flush_interval=60)
+
+    async def scenario():
+        await db.pool.open()
+        await writer.start()
+        for i in range(5):
+            user = "00000000-0000-0000-0000-00000000beef" if i == 3 else None  # no such user
+            writer.log(TENANT, user, "query", {"i": i})
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.failed == 1
+    assert writer.written == 4
+    assert [row["details"]["i"] for row in fake_db.audit_logs] == [0, 1, 2, 4]
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from uuid import UUID
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from psycopg_pool import PoolTimeout
+
+from app import crud, db, main, schemas
+from app.config import settings
+from app.services import auth
+from app.services.auth import UserCache, create_access_token, get_current_user, invalidate_tenant_users, invalidate_user
+from loadtest.fakedb import FakeDatabase, FakePool
+
+TENANT_A = UUID(int=1)
+TENANT_B = UUID(int=2)
+
+
+def _user(n, tenant_id=TENANT_A, role="user"):
+    return schemas.UserOut(id=UUID(int=100 + n), tenant_id=tenant_id, email=f"u{n}@example.com", role=role)
+
+
+def _credentials(user):
+    token = create_access_token(
+        {"sub": str(user.id), "tenant_id": str(user.tenant_id), "email": user.email, "role": user.role}
+    )
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.fixture
+def user_cache(monkeypatch):
+    cache = UserCache(ttl=60, max_size=100)
+    monkeypatch.setattr(auth, "user_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "pool", FakePool(fake, max_size=2))
+    asyncio.run(db.pool.open())
+    return fake
+
+
+def test_entries_expire_after_the_ttl():
+    cache = UserCache(ttl=0.05, max_size=10)
+    cache.put(_user(1))
+    assert cache.get(_user(1).id) == _user(1)
+    time.sleep(0.06)
+    assert cache.get(_user(1).id) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = UserCache(ttl=60, max_size=2)
+    cache.put(_user(1))
+    cache.put(_user(2))
+    cache.get(_user(1).id)
+    cache.put(_user(3))
+    assert cache.get(_user(2).id) is None
+    assert cache.get(_user(1).id) is not None and cache.get(_user(3).id) is not None
+
+
+def test_zero_ttl_disables_the_cache():
+    cache = UserCache(ttl=0, max_size=10)
+    cache.put(_user(1))
+    assert len(cache) == 0
+
+
+def test_invalidation_hooks(user_cache):
+    for user in (_user(1), _user(2), _user(3, tenant_id=TENANT_B)):
+        user_cache.put(user)
+    invalidate_user(str(_user(1).id))
+    assert user_cache.get(_user(1).id) is None
+    invalidate_tenant_users(TENANT_A)
+    assert user_cache.get(_user(2).id) is None
+    assert user_cache.get(_user(3).id) == _user(3, tenant_id=TENANT_B)
+
+
+def test_cached_user_skips_the_database_until_invalidated(user_cache, fake_db):
+    user = _user(1)
+    fake_db.users[str(user.id)] = {
+        "id": str(user.id), "tenant_id": str(user.tenant_id), "email": user.email, "role": "user",
+        "password_hash": "x",
+    }
+    assert asyncio.run(get_current_user(_credentials(user))) == user
+    # a role change in the database is not seen while the entry is cached ...
+    fake_db.users[str(user.id)]["role"] = "admin"
+    assert asyncio.run(get_current_user(_credentials(user))).role == "user"
+    # ... until the hook drops it
+    invalidate_user(user.id)
+    assert asyncio.run(get_current_user(_credentials(user))).role == "admin"
+    # deleted users are rejected once their entry is gone
+    del fake_db.users[str(user.id)]
+    invalidate_user(user.id)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_current_user(_credentials(user)))
+    assert exc.value.status_code == 401
+
+
+def test_stateless_mode_trusts_the_token(user_cache, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_STATELESS", True)
+    monkeypatch.setattr(db, "pool", None)  # any database access would fail
+    user = _user(1, role="admin")
+    assert asyncio.run(get_current_user(_credentials(user))) == user
+    assert len(user_cache) == 0
+
+
+def test_pool_timeout_on_user_creation_is_a_503(monkeypatch):
+    @asynccontextmanager
+    async def exhausted():
+        raise PoolTimeout("couldn't get a connection after 30.00 sec")
+        yield
+
+    monkeypatch.setattr(crud, "hash_password", lambda password: "hash")
+    monkeypatch.setattr(db, "connection", exhausted)
+    payload = schemas.UserCreate(tenant_id=TENANT_A, email="new@example.com", password="pw")
+    with pytest.raises(PoolTimeout) as exc_info:
+        asyncio.run(main.create_user(payload))
+    response = asyncio.run(main.pool_timeout_handler(None, exc_info.value))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
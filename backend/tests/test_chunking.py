@@ -0,0 +1,78 @@
+from app.services.chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP, chunk_text, merge_adjacent_hits, pack_context
+
+
+def _hits(text, page=1):
+    return [
+        {"document_id": "d1", "chunk_index": i, "page": page, "filename": "f.pdf", "text": c, "score": 1.0}
+        for i, c in enumerate(chunk_text(text))
+    ]
+
+
+def test_merge_drops_exactly_the_chunk_overlap():
+    text = " ".join(f"w{i}" for i in range(400))
+    spans = merge_adjacent_hits(_hits(text))
+    assert len(spans) == 1
+    assert spans[0]["text"] == text
+    assert spans[0]["chunk_indices"] == [0, 1]
+
+
+def test_merge_keeps_periodic_text():
+    # a form page repeating the same fields: suffix/prefix matches far longer than the overlap
+    text = " ".join(["name datum unterschrift abteilung"] * 100)
+    hits = _hits(text)
+    assert [len(h["text"].split()) for h in hits] == [CHUNK_MAX_TOKENS, 400 - (CHUNK_MAX_TOKENS - CHUNK_OVERLAP)]
+    spans = merge_adjacent_hits(hits)
+    assert len(spans[0]["text"].split()) == 400
+    assert spans[0]["text"] == text
+
+
+def test_merge_does_not_dedupe_across_pages():
+    a = {"document_id": "d1", "chunk_index": 0, "page": 1, "text": "a b c", "score": 1.0}
+    b = {"document_id": "d1", "chunk_index": 1, "page": 2, "text": "b c d", "score": 0.5}
+    spans = merge_adjacent_hits([a, b])
+    assert spans[0]["text"] == "a b c b c d"
+    assert spans[0]["page"] == "1-2"
+
+
+def test_merge_keeps_gaps_and_documents_apart():
+    hits = [
+        {"document_id": "d1", "chunk_index": 0, "page": 1, "text": "a b", "score": 0.2},
+        {"document_id": "d1", "chunk_index": 2, "page": 1, "text": "c d", "score": 0.9},
+        {"document_id": "d2", "chunk_index": 1, "page": 1, "text": "e f", "score": 0.5},
+    ]
+    spans = merge_adjacent_hits(hits)
+    assert sorted((sp["document_id"], sp["chunk_indices"]) for sp in spans) == [("d1", [0]), ("d1", [2]), ("d2", [1])]
+
+
+def _span(score, *members):
+    # members: (n_tokens, score) of consecutive chunks
+    tokens, spans, start = [], [], 0
+    for i, (n, sc) in enumerate(members):
+        tokens += [f"t{i}_{j}" for j in range(n)]
+        spans.append((start, start + n, sc))
+        start += n
+    return {"document_id": "d", "chunk_indices": list(range(len(members))), "text": " ".join(tokens), "score": score, "members": spans}
+
+
+def test_pack_context_orders_by_score_without_budget():
+    low, high = _span(0.1, (5, 0.1)), _span(0.9, (5, 0.9))
+    assert pack_context([low, high], None) == [high, low]
+
+
+def test_pack_context_trims_to_the_best_chunks():
+    big = _span(0.9, (10, 0.2), (10, 0.9), (10, 0.5))
+    small = _span(0.4, (5, 0.4))
+    packed = pack_context([big, small], 25)
+    # the 30-token span keeps its best chunk and the better neighbour, then the small one fits
+    assert packed[0]["chunk_indices"] == [1, 2]
+    assert packed[0]["text"].split()[0] == "t1_0"
+    assert packed[1] is small
+    assert sum(len(sp["text"].split()) for sp in packed) == 25
+
+
+def test_pack_context_skips_what_does_not_fit_but_is_never_empty():
+    big = _span(0.9, (20, 0.9))
+    small = _span(0.1, (4, 0.1))
+    assert pack_context([big, small], 8) == [small]
+    truncated = pack_context([big], 8)
+    assert len(truncated) == 1 and len(truncated[0]["text"].split()) == 8
@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.executors import BoundedExecutor
+
+
+def _process_pool(workers: int = 1) -> BoundedExecutor:
+    return BoundedExecutor(
+        "test",
+        lambda: ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")),
+        workers=workers,
+        max_pending=8,
+    )
+
+
+def test_dead_worker_does_not_break_later_jobs():
+    ex = _process_pool()
+
+    async def scenario():
+        with pytest.raises(BrokenProcessPool):
+            await ex.run(os._exit, 1)
+        return await ex.run(abs, -3)
+
+    try:
+        assert asyncio.run(scenario()) == 3
+        assert ex.stats()["restarts"] == 1
+    finally:
+        ex.shutdown()
+
+
+def test_timed_out_job_is_killed_and_pool_recovers():
+    ex = _process_pool()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await ex.run(time.sleep, 30, timeout=0.5)
+        return await ex.run(abs, -4, timeout=30)
+
+    try:
+        started = time.monotonic()
+        assert asyncio.run(scenario()) == 4
+        assert time.monotonic() - started < 20
+        assert ex.stats()["timed_out"] == 1
+    finally:
+        ex.shutdown()
+
+
+def test_timeout_kill_resubmits_the_other_jobs_of_the_pool():
+    ex = _process_pool(workers=2)
+
+    async def scenario():
+        # warm the pool so all jobs start at the same time
+        await asyncio.gather(ex.run(abs, -1), ex.run(abs, -1))
+        hung = ex.run(time.sleep, 30, timeout=0.5)
+        running = ex.run(time.sleep, 2, timeout=30)  # on the other worker when the pool is killed
+        queued = ex.run(abs, -5, timeout=30)  # waiting for a free worker
+        return await asyncio.gather(hung, running, queued, return_exceptions=True)
+
+    try:
+        started = time.monotonic()
+        hung, running, queued = asyncio.run(scenario())
+        assert isinstance(hung, asyncio.TimeoutError)
+        assert running is None
+        assert queued == 5
+        assert time.monotonic() - started < 20
+        stats = ex.stats()
+        assert (stats["timed_out"], stats["restarts"], stats["resubmitted"], stats["failed"]) == (1, 1, 2, 1)
+    finally:
+        ex.shutdown()
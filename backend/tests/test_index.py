@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from app.schemas import PageRange, QueryFilters
+from app.services.index import (
+    TenantIndex,
+    _phrase_match,
+    _snippet,
+    decode_positions,
+    encode_positions,
+    parse_query,
+    search_rows,
+)
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _doc(n, texts, filename=None, created_at=T0):
+    document_id = UUID(int=n)
+    return [
+        {
+            "document_id": document_id,
+            "chunk_index": i,
+            "text": text,
+            "metadata": {"filename": filename or f"doc{n}.pdf", "page": i + 1},
+            "original_filename": filename or f"doc{n}.pdf",
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+def _rows():
+    return (
+        _doc(1, ["vacation policy allows twenty days", "sick leave needs a note", "vacation carry over rules"])
+        + _doc(2, ["travel expenses policy", "vacation requests go to hr", "policy on remote work"])
+        + _doc(3, ["security policy for laptops", "passwords rotate yearly"], created_at=T0 + timedelta(days=30))
+    )
+
+
+def _key(hits):
+    return [(str(h["document_id"]), h["chunk_index"], round(h["score"], 9)) for h in hits]
+
+
+def test_varint_round_trip():
+    for positions in ([], [0], [5], [0, 1, 2], [127, 128, 300], [3, 200, 20000, 3_000_000]):
+        assert decode_positions(encode_positions(positions)) == positions
+    # deltas below 128 take one byte each
+    assert len(encode_positions([10, 20, 137])) == 3
+    assert len(encode_positions([0, 128])) == 3
+
+
+def test_parse_query_phrases():
+    tokens, phrases = parse_query('Urlaub "carry over"~2 and "Sick Leave"')
+    assert phrases == [(["carry", "over"], 2), (["sick", "leave"], 0)]
+    assert tokens == ["urlaub", "and", "carry", "over", "sick", "leave"]
+
+
+def test_phrase_match_exact_and_proximity():
+    # "a b" at 3-4
+    assert _phrase_match([[1, 3], [4, 9]], 0)
+    assert not _phrase_match([[1, 5], [4, 9]], 0)
+    # order matters for exact phrases only
+    assert not _phrase_match([[4], [3]], 0)
+    assert _phrase_match([[4], [3]], 1)
+    # proximity: window of len(words) + slop tokens, any order
+    assert _phrase_match([[10], [7]], 2)  # window 7..10 = 4 tokens
+    assert not _phrase_match([[10], [7]], 1)
+    assert _phrase_match([[0, 50], [52], [49]], 1)
+    assert not _phrase_match([[0], [52], [49]], 1)
+
+
+def test_snippet_centers_matches_and_highlights_them():
+    tokens = [f"w{i}" for i in range(100)]
+    text, ranges = _snippet(tokens, [60, 61, 95], size=10)
+    words = text.split()
+    assert len(words) == 10 and "w60" in words and "w61" in words
+    # adjacent matches form one range
+    assert [text[a:b] for a, b in ranges] == ["w60 w61"]
+
+
+def test_snippet_of_short_text():
+    tokens = ["vacation", "policy", "allows", "twenty", "days"]
+    text, ranges = _snippet(tokens, [0, 3])
+    assert text == "vacation policy allows twenty days"
+    assert [text[a:b] for a, b in ranges] == ["vacation", "twenty"]
+    assert _snippet(tokens, []) == (text, [])
+
+
+def test_incremental_add_document_matches_a_rebuild():
+    index = TenantIndex.from_rows(_rows())
+    kept = index.documents[str(UUID(int=2))]["slots"][2]
+    new_doc2 = _doc(2, ["remote work needs approval", "travel expenses policy", "policy on remote work", "vacation policy"])
+    index.add_document(UUID(int=2), new_doc2)
+
+    rows = [r for r in _rows() if r["document_id"] != UUID(int=2)] + new_doc2
+    rebuilt = TenantIndex.from_rows(rows)
+    assert (index.n_live, index.total_len) == (rebuilt.n_live, rebuilt.total_len)
+    assert {t: len(p) for t, p in index.postings.items()} == {t: len(p) for t, p in rebuilt.postings.items()}
+    # unchanged chunks keep their slot (and postings) and only move chunk_index
+    assert index.documents[str(UUID(int=2))]["slots"][2] == kept
+    assert index.records[kept]["chunk_index"] == 2
+    for question in ["vacation policy", "remote work", '"travel expenses"']:
+        assert sorted(_key(index.search(question, 10))) == sorted(_key(rebuilt.search(question, 10)))
+
+
+def test_filtered_search_scores_like_the_cold_path():
+    rows = _rows()
+    index = TenantIndex.from_rows(rows)
+    cases = [
+        (QueryFilters(document_ids=[UUID(int=1)]), lambda r: r["document_id"] == UUID(int=1)),
+        (QueryFilters(filenames=["doc2.pdf", "doc3.pdf"]), lambda r: r["original_filename"] != "doc1.pdf"),
+        (QueryFilters(pages=[PageRange(start=2, end=3)]), lambda r: r["metadata"]["page"] >= 2),
+        (QueryFilters(uploaded_after=T0 + timedelta(days=1)), lambda r: r["updated_at"] > T0),
+    ]
+    for filters, keep in cases:
+        for question in ["vacation policy", "policy", '"vacation carry"']:
+            cold = search_rows([r for r in rows if keep(r)], question, 5)
+            warm = index.search(question, 5, filters)
+            assert _key(warm) == _key(cold), (filters, question)
+
+
+def test_filter_covering_everything_scores_like_no_filter():
+    index = TenantIndex.from_rows(_rows())
+    everything = QueryFilters(uploaded_after=T0 - timedelta(days=1))
+    assert _key(index.search("vacation policy", 5, everything)) == _key(index.search("vacation policy", 5))
+
+
+def test_naive_upload_filters_are_utc():
+    index = TenantIndex.from_rows(_rows())
+    naive = QueryFilters(uploaded_after=(T0 + timedelta(days=1)).replace(tzinfo=None))
+    aware = QueryFilters(uploaded_after=T0 + timedelta(days=1))
+    assert naive.uploaded_after == aware.uploaded_after
+    assert _key(index.search("vacation policy", 5, naive)) == _key(index.search("vacation policy", 5, aware))
+
+
+def test_compact_drops_dead_slots_and_keeps_results():
+    index = TenantIndex.from_rows(_rows())
+    for version in range(5):
+        texts = ["vacation policy allows twenty days", f"sick leave version {version}", "vacation carry over rules"]
+        index.add_document(UUID(int=1), _doc(1, texts))
+    index.remove_document(UUID(int=3))
+    assert len(index.records) > index.n_live
+
+    before = _key(index.search("vacation policy version", 5))
+    assert index.compact()
+    assert len(index.records) == len(index.doc_len) == len(index.doc_terms) == index.n_live
+    assert None not in index.records
+    assert _key(index.search("vacation policy version", 5)) == before
+    assert sorted(s for doc in index.documents.values() for s in doc["slots"]) == list(range(index.n_live))
+    assert not index.compact()
+
+
+def test_compact_waits_for_the_dead_share():
+    index = TenantIndex.from_rows(_rows())
+    index.add_document(UUID(int=1), _doc(1, ["vacation policy allows twenty days", "sick leave changed", "vacation carry over rules"]))
+    assert len(index.records) == index.n_live + 1
+    assert not index.compact()
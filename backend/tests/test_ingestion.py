@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from app.schemas import QueryFilters
+from app.services.index import TenantIndex
+from app.services.ingestion import content_hash, diff_chunks
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _chunk(i, text, page=1):
+    return {"chunk_index": i, "text": text, "metadata": {"filename": "f.pdf", "page": page}, "content_hash": content_hash(text)}
+
+
+def _stored(texts):
+    return [dict(_chunk(i, t), id=f"id{i}") for i, t in enumerate(texts)]
+
+
+def test_content_hash_is_postgres_md5():
+    assert content_hash("abc") == "900150983cd24fb0d6963f7d28e17f72"
+
+
+def test_diff_of_an_unchanged_version_is_empty():
+    texts = ["a b c", "d e f", "g h i"]
+    assert diff_chunks(_stored(texts), [_chunk(i, t) for i, t in enumerate(texts)]) == ([], [], [])
+
+
+def test_diff_inserts_moves_and_deletes():
+    stored = _stored(["intro", "old terms", "pricing", "contact"])
+    new = [_chunk(0, "intro"), _chunk(1, "new summary"), _chunk(2, "pricing"), _chunk(3, "contact", page=2)]
+    inserts, updates, deletes = diff_chunks(stored, new)
+    assert [c["text"] for c in inserts] == ["new summary"]
+    # pricing kept its index; contact moved to another page
+    assert updates == [("id3", 3, {"filename": "f.pdf", "page": 2})]
+    assert deletes == ["id1"]
+
+
+def test_diff_matches_repeated_chunks_in_order():
+    stored = _stored(["header", "body", "header"])
+    new = [_chunk(0, "body"), _chunk(1, "header")]
+    inserts, updates, deletes = diff_chunks(stored, new)
+    assert inserts == []
+    assert updates == [("id1", 0, {"filename": "f.pdf", "page": 1}), ("id0", 1, {"filename": "f.pdf", "page": 1})]
+    # the second stored "header" has no twin left
+    assert deletes == ["id2"]
+
+
+def _rows(n, texts, created_at, updated_at=None):
+    return [
+        {
+            "document_id": UUID(int=n),
+            "chunk_index": i,
+            "text": text,
+            "metadata": {"filename": f"doc{n}.pdf", "page": 1},
+            "original_filename": f"doc{n}.pdf",
+            "created_at": created_at,
+            "updated_at": updated_at or created_at,
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_uploaded_filters_use_the_current_version():
+    index = TenantIndex.from_rows(
+        _rows(1, ["vacation policy"], T0) + _rows(2, ["travel policy"], T0 + timedelta(days=30))
+    )
+    # document 1 re-uploaded on day 40; it was created on day 0
+    index.add_document(UUID(int=1), _rows(1, ["vacation policy v2"], T0, updated_at=T0 + timedelta(days=40)))
+    after = {h["document_id"] for h in index.search("policy", 10, QueryFilters(uploaded_after=T0 + timedelta(days=35)))}
+    before = {h["document_id"] for h in index.search("policy", 10, QueryFilters(uploaded_before=T0 + timedelta(days=35)))}
+    assert after == {UUID(int=1)}
+    assert before == {UUID(int=2)}
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from uuid import UUID
+
+import pytest
+
+from app import db, main, schemas
+from app.config import settings
+from app.services import rag
+from app.services.executors import BoundedExecutor
+from app.services.ingestion import content_hash
+from loadtest.fakedb import FakeDatabase, FakePool
+
+TENANT = UUID(int=1)
+DOCUMENT = UUID(int=10)
+USER = schemas.UserOut(id=UUID(int=100), tenant_id=TENANT, email="u@example.com", role="user")
+
+
+@pytest.fixture(autouse=True)
+def app_state(monkeypatch):
+    fake = FakeDatabase()
+    now = datetime.now(timezone.utc)
+    fake.tenants[str(TENANT)] = {"id": str(TENANT), "name": "t", "created_at": now}
+    fake.documents[str(DOCUMENT)] = {
+        "id": str(DOCUMENT), "tenant_id": str(TENANT), "title": "handbuch.pdf", "original_filename": "handbuch.pdf",
+        "storage_path": "", "status": "ready", "version": 1, "created_at": now, "updated_at": now,
+    }
+    for i, text in enumerate(["urlaub antrag im portal stellen", "reisekosten abrechnung bis monatsende"]):
+        fake.chunks.append({
+            "id": f"c{i}", "tenant_id": str(TENANT), "document_id": str(DOCUMENT), "chunk_index": i, "text": text,
+            "content_hash": content_hash(text), "metadata": {"filename": "handbuch.pdf", "page": i + 1},
+        })
+    monkeypatch.setattr(db, "pool", FakePool(fake, max_size=2))
+    monkeypatch.setattr(settings, "AUDIT_ENABLED", False)
+    # index builds in a thread instead of the spawned process pool
+    monkeypatch.setattr(
+        rag, "cpu_executor", BoundedExecutor("test", lambda: ThreadPoolExecutor(max_workers=1), workers=1, max_pending=4)
+    )
+    rag.index_cache.clear()
+    yield
+    rag.cpu_executor.shutdown()
+    rag.index_cache.clear()
+
+
+def _stream(question):
+    async def scenario():
+        await db.pool.open()
+        response = await main.query_data_stream(schemas.QueryRequest(question=question), USER)
+        assert response.media_type == "text/event-stream"
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    events = []
+    for block in asyncio.run(scenario()).split("\n\n")[:-1]:
+        event_line, data_line = block.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def test_sources_then_tokens_then_done():
+    events = _stream("urlaub antrag")
+    names = [name for name, _ in events]
+    assert names[0] == "sources" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"} and len(names) > 3
+    sources = events[0][1]
+    assert [s["chunk_index"] for s in sources] == [0]
+    assert sources[0]["highlights"]
+    answer = "".join(data["text"] for name, data in events if name == "token")
+    assert answer.startswith("DUMMY_ANSWER")
+    assert "urlaub antrag im portal stellen" in answer
+
+
+def test_no_hits_sends_the_fallback_answer():
+    assert _stream("kantine parkplatz") == [
+        ("sources", []),
+        ("token", {"text": main.NO_HITS_ANSWER}),
+        ("done", {}),
+    ]
+
+
+def test_llm_failure_ends_with_error_instead_of_done(monkeypatch):
+    async def failing_llm(prompt):
+        yield "Teil"
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(rag, "stream_llm", failing_llm)
+    events = _stream("urlaub")
+    assert [name for name, _ in events] == ["sources", "token", "error"]
+    assert events[1][1] == {"text": "Teil"}
+    assert "provider down" in events[2][1]["detail"]
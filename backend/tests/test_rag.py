@@ -0,0 +1,50 @@
+import asyncio
+from uuid import UUID
+
+from psycopg_pool import PoolTimeout
+
+from app import db
+from app.schemas import PageRange, QueryFilters
+from app.services import rag
+from app.services.index import TenantIndex
+from app.services.rag import CHUNK_FILTER_CONDITIONS, IndexCache, build_chunks_query
+from loadtest.fakedb import FakeDatabase, FakePool
+
+TENANT = UUID(int=7)
+
+
+def test_page_ranges_are_ored_between_conditions():
+    sql, params = build_chunks_query(TENANT, QueryFilters(pages=[PageRange(start=2, end=3), PageRange(start=6)]))
+    page = CHUNK_FILTER_CONDITIONS["pages"]
+    assert f"AND ({page} OR {page})" in sql
+    assert "unnest" not in sql
+    assert params == [str(TENANT), 2, 3, 6, 6]
+
+
+def test_empty_page_list_matches_nothing():
+    sql, params = build_chunks_query(TENANT, QueryFilters(pages=[]))
+    assert f"AND ({CHUNK_FILTER_CONDITIONS['pages']})" in sql
+    assert params == [str(TENANT), 1, 0]
+
+
+def test_failed_version_check_serves_the_cached_index(monkeypatch):
+    calls = []
+
+    async def unavailable(conn, tenant_id):
+        calls.append(tenant_id)
+        raise PoolTimeout("couldn't get a connection after 5.00 sec")
+
+    monkeypatch.setattr(db, "pool", FakePool(FakeDatabase(), max_size=1))
+    monkeypatch.setattr(rag, "fetch_index_version", unavailable)
+    cache = IndexCache(max_tenants=4, sync_interval=60)
+    index = TenantIndex.from_rows([])
+    cache._store(str(TENANT), index)
+    cache._checked_at[str(TENANT)] = float("-inf")
+
+    async def scenario():
+        await db.pool.open()
+        return [await cache.get(TENANT), await cache.get(TENANT)]
+
+    assert asyncio.run(scenario()) == [index, index]
+    assert calls == [str(TENANT)]  # the second get() doesn't retry before sync_interval
+    assert cache.stats()["sync_errors"] == 1
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.scheduler import FairScheduler, TenantThrottled
+
+
+def _scheduler(**kw):
+    params = dict(slots=1, per_tenant=1, rate=0, burst=1, max_queue=1)
+    params.update(kw)
+    return FairScheduler("test", **params)
+
+
+def test_full_queue_rejects_without_using_a_token():
+    sched = _scheduler(rate=0.001, burst=3)
+
+    async def scenario():
+        running = await sched.acquire("a")  # token 1
+        queued = asyncio.create_task(sched.acquire("a"))  # token 2
+        await asyncio.sleep(0)
+        for _ in range(5):
+            with pytest.raises(TenantThrottled) as exc:
+                await sched.acquire("a")
+            assert exc.value.reason == "too many queued requests"
+        sched._release(running)
+        sched._release(await queued)
+        # the rejected requests left the third token
+        sched._release(await sched.acquire("a"))
+        with pytest.raises(TenantThrottled) as exc:
+            await sched.acquire("a")
+        assert exc.value.reason == "rate limit exceeded"
+
+    asyncio.run(scenario())
+    st = sched.tenants["a"]
+    assert (st.admitted, st.rejected_queue, st.rejected_rate) == (3, 5, 1)
+
+
+def test_idle_tenants_are_forgotten_once_their_bucket_is_full():
+    sched = _scheduler(slots=4, per_tenant=2, rate=20, burst=2)
+    sched.sweep_interval = 0
+
+    async def scenario():
+        busy = await sched.acquire("busy")
+        for _ in range(2):
+            sched._release(await sched.acquire("t1"))  # t1's bucket is empty now
+        sched._release(await sched.acquire("t2"))
+        time.sleep(0.06)  # t2 refills, t1 is still missing a token
+        other = await sched.acquire("other")
+        assert set(sched.tenants) == {"busy", "t1", "other"}
+        time.sleep(0.06)
+        sched._release(other)
+        await sched.acquire("busy2")
+        # "busy" / "busy2" hold a slot
+        assert set(sched.tenants) == {"busy", "busy2"}
+        sched._release(busy)
+
+    asyncio.run(scenario())
+    assert sched.stats()["tenants_evicted"] == 3
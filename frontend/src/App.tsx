@@ -1,9 +1,22 @@
 // frontend/src/App.tsx
 import { useState, useEffect } from "react";
-import { login, uploadDocument, queryData } from "./api";
+import { login, uploadDocument, queryDataStream } from "./api";
 import type { QueryResponse } from "./api";
 import "./App.css";
 
+// Wrap the [start, end) highlight ranges of a source snippet in <mark>
+function renderHighlighted(text: string, highlights: [number, number][] = []) {
+  const parts: React.ReactNode[] = [];
+  let pos = 0;
+  highlights.forEach(([start, end], i) => {
+    if (start > pos) parts.push(text.slice(pos, start));
+    parts.push(<mark key={i}>{text.slice(start, end)}</mark>);
+    pos = end;
+  });
+  if (pos < text.length) parts.push(text.slice(pos));
+  return parts;
+}
+
 function App() {
   // Auth state
   const [tenantId, setTenantId] = useState("");
@@ -83,7 +96,10 @@ function App() {
     try {
       const res = await uploadDocument(token, selectedFile);
       setUploadStatus(
-        `Uploaded "${selectedFile.name}". Document ID: ${res.document_id}, status: ${res.status}`
+        `Uploaded "${selectedFile.name}". Document ID: ${res.document_id}, status: ${res.status}` +
+          (res.version > 1
+            ? `, version ${res.version} (${res.inserted} new, ${res.deleted} removed, ${res.kept} unchanged chunks)`
+            : "")
       );
       setSelectedFile(null);
     } catch (err: any) {
@@ -104,13 +120,26 @@ function App() {
     }
     setQueryError(null);
     setQueryLoading(true);
+    setQueryResult(null);
     try {
-      const res = await queryData(token, question, 5);
-      setQueryResult(res);
+      // sources arrive as soon as retrieval is done, the answer streams in afterwards
+      let answer = "";
+      await queryDataStream(
+        token,
+        question,
+        {
+          onSources: (sources) => setQueryResult({ answer: "", sources }),
+          onToken: (text) => {
+            answer += text;
+            setQueryResult((prev) => (prev ? { ...prev, answer } : prev));
+          },
+        },
+        5
+      );
 
       // store a small preview in history
       const preview =
-        res.answer.length > 120 ? res.answer.slice(0, 120) + "…" : res.answer;
+        answer.length > 120 ? answer.slice(0, 120) + "…" : answer;
       setQueryHistory((prev) => [
         { question, answerPreview: preview },
         ...prev.slice(0, 4), // keep last 5
@@ -267,9 +296,7 @@ function App() {
                           </span>
                         </div>
                         <div className="source-text">
-                          {s.text.length > 300
-                            ? s.text.slice(0, 300) + "…"
-                            : s.text}
+                          {renderHighlighted(s.text, s.highlights)}
                         </div>
                       </li>
                     ))}
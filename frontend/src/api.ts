@@ -52,14 +52,25 @@ export interface QueryResponse {
   sources: {
     document_id: string;
     chunk_index: number;
-    text: string;
+    text: string; // snippet around the matches
+    highlights?: [number, number][]; // [start, end) ranges of matches in text
   }[];
 }
 
+// Optional retrieval filters; only chunks matching all given filters are searched.
+export interface QueryFilters {
+  document_ids?: string[];
+  filenames?: string[];
+  pages?: { start: number; end?: number }[];
+  uploaded_after?: string; // ISO timestamp
+  uploaded_before?: string;
+}
+
 export async function queryData(
   token: string,
   question: string,
-  topK: number = 5
+  topK: number = 5,
+  filters?: QueryFilters
 ): Promise<QueryResponse> {
   const res = await fetch(`${API_BASE_URL}/query`, {
     method: "POST",
@@ -67,7 +78,7 @@ export async function queryData(
       "Content-Type": "application/json",
       Authorization: `Bearer ${token}`,
     },
-    body: JSON.stringify({ question, top_k: topK }),
+    body: JSON.stringify({ question, top_k: topK, filters }),
   });
 
   if (!res.ok) {
@@ -77,3 +88,62 @@ export async function queryData(
 
   return res.json();
 }
+
+export interface QueryStreamHandlers {
+  onSources: (sources: QueryResponse["sources"]) => void;
+  onToken: (text: string) => void;
+}
+
+// Streaming variant of queryData: /query/stream sends Server-Sent Events
+// ("sources", then "token" deltas, then "done"). EventSource only supports GET,
+// so we read the response body ourselves.
+export async function queryDataStream(
+  token: string,
+  question: string,
+  handlers: QueryStreamHandlers,
+  topK: number = 5,
+  filters?: QueryFilters
+): Promise<void> {
+  const res = await fetch(`${API_BASE_URL}/query/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`,
+    },
+    body: JSON.stringify({ question, top_k: topK, filters }),
+  });
+
+  if (!res.ok || !res.body) {
+    const text = await res.text();
+    throw new Error(`Query failed: ${res.status} ${text}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep: number;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === "sources") handlers.onSources(payload);
+      else if (event === "token") handlers.onToken(payload.text);
+      else if (event === "error") throw new Error(payload.detail || "Query failed");
+      else if (event === "done") return;
+    }
+  }
+}